@@ -1,6 +1,7 @@
 import os
-from dotenv import load_dotenv
-load_dotenv()
+import time
+# Importing the registry loads .env once for the whole process
+from llm_registry import registry
 
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
@@ -8,30 +9,93 @@ TAVILY_API_KEY = os.environ.get("TAVILY_API_KEY")
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 
 
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_tavily import TavilySearch 
-from langchain.agents import create_agent
 from langchain_core.messages.ai import AIMessage
+from streaming import astream_agent
+from instrumentation import ToolTimingHandler
+from memory import conversation_memory, render_messages, SUMMARY_PROMPT
+from hedging import hedge_policy
+from ratelimit import rate_limits, prompt_tokens
 
 
 system_prompt="Act as an AI chatbot who is smart and friendly"
 
-def get_response_from_ai_agent(llm_id, query, allow_search, system_prompt, provider):
-    if provider=="Groq":
-        llm=ChatGroq(model=llm_id)
-    elif provider=="Gemini":
-        llm=ChatGoogleGenerativeAI(model=llm_id, google_api_key=GEMINI_API_KEY)
-
-    tools=[TavilySearch(max_results=2)] if allow_search else []
-
-    agent = create_agent(
-        model=llm,
-        tools=tools,
-        system_prompt=system_prompt,
-    )
-    state = {"messages": query}
-    response = agent.invoke(state)
+def summarizer(llm_id, provider):
+    """Summary callback for conversation_memory; runs on its worker threads"""
+    def summarize(previous_summary, messages):
+        agent = registry.get_agent(llm_id, provider, SUMMARY_PROMPT, [])
+        text = f"Existing summary:\n{previous_summary or 'None'}\n\nNew messages:\n{render_messages(messages)}"
+        response = rate_limits.run_sync(provider, llm_id, lambda: agent.invoke({"messages": [text]}),
+                                        prompt_tokens(SUMMARY_PROMPT, [text]))
+        ai_messages = [message.content for message in response.get("messages") if isinstance(message, AIMessage)]
+        return ai_messages[-1]
+    return summarize
+
+def record_response(tracker, started, messages, tool_timer, llm_id, provider, hedge):
+    """Record the response phase, under the fallback model if a hedge or failover answered"""
+    if tracker is None:
+        return
+    tracker.record("response", "agent", started, time.perf_counter(), messages, tool_timer.tool_calls,
+                   model=hedge["model"] if hedge else llm_id, provider=hedge["provider"] if hedge else provider)
+    if hedge is not None:
+        tracker.annotate(metadata={"hedging": [hedge]})
+
+def remember(llm_id, provider, query, answer, memory_stats, tracker):
+    """Report memory savings and queue the background summary update"""
+    if tracker is not None:
+        tracker.annotate(memory=memory_stats)
+    conversation_memory.schedule_update([*query, {"role": "assistant", "content": answer}], llm_id,
+                                        summarizer(llm_id, provider))
+
+def get_response_from_ai_agent(llm_id, query, allow_search, system_prompt, provider, tracker=None):
+    tools=[registry.get_search_tool(max_results=2)] if allow_search else []
+
+    context, memory_stats = conversation_memory.prepare(query, llm_id)
+    state = {"messages": context}
+    tool_timer = ToolTimingHandler()
+
+    def call(call_provider, call_model):
+        agent = registry.get_agent(call_model, call_provider, system_prompt, tools)
+        return rate_limits.run_sync(call_provider, call_model,
+                                    lambda: agent.invoke(state, config={"callbacks": [tool_timer]}),
+                                    prompt_tokens(system_prompt, context))
+
+    started = time.perf_counter()
+    response, hedge = hedge_policy.run_sync("response", provider, llm_id, call)
+    messages = response.get("messages")
+    record_response(tracker, started, messages, tool_timer, llm_id, provider, hedge)
+    ai_messages = [message.content for message in messages if isinstance(message, AIMessage)]
+    remember(llm_id, provider, query, ai_messages[-1], memory_stats, tracker)
+    return ai_messages[-1]
+
+async def aget_response_from_ai_agent(llm_id, query, allow_search, system_prompt, provider, emit=None, tracker=None):
+    tools=[registry.get_search_tool(max_results=2)] if allow_search else []
+
+    context, memory_stats = conversation_memory.prepare(query, llm_id)
+    state = {"messages": context}
+    tool_timer = ToolTimingHandler()
+    config = {"callbacks": [tool_timer]}
+    emitted = False
+
+    async def on_token(text):
+        nonlocal emitted
+        emitted = True
+        await emit({"type": "token", "phase": "response", "text": text})
+
+    async def call(call_provider, call_model):
+        agent = registry.get_agent(call_model, call_provider, system_prompt, tools)
+
+        async def invoke():
+            if emit:
+                return await astream_agent(agent, state, on_token, config=config)
+            return await agent.ainvoke(state, config=config)
+        return await rate_limits.run(call_provider, call_model, invoke, prompt_tokens(system_prompt, context),
+                                     can_retry=lambda: not emitted)
+
+    started = time.perf_counter()
+    response, hedge = await hedge_policy.run("response", provider, llm_id, call, hedge=not emit,
+                                             can_failover=lambda: not emitted)
     messages = response.get("messages")
+    record_response(tracker, started, messages, tool_timer, llm_id, provider, hedge)
     ai_messages = [message.content for message in messages if isinstance(message, AIMessage)]
-    return ai_messages[-1]
\ No newline at end of file
+    remember(llm_id, provider, query, ai_messages[-1], memory_stats, tracker)
+    return ai_messages[-1]
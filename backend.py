@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from typing import List, Optional
 
 
@@ -9,19 +9,181 @@ class RequestModel(BaseModel):
     messages: List[str]
     allow_search: bool
     use_multi_agent: Optional[bool] = False
-    agent_mode: Optional[str] = "sequential"  # "sequential" or "debate"
+    agent_mode: Optional[str] = "sequential"  # "sequential", "debate" or the name of a registered graph
+    debate_research: Optional[str] = None  # "shared" or "per_agent"; server default when unset
+    semantic_cache: Optional[bool] = None  # near-duplicate query cache for multi-agent runs; server default when unset
+    bypass_cache: Optional[bool] = False  # skip the cache lookup, still store the fresh result
+    force_full_pipeline: Optional[bool] = None  # skip query routing for sequential runs; server default when unset
 
 
-from fastapi import FastAPI
-from ai_agent import get_response_from_ai_agent
-from multi_agent import MultiAgentOrchestrator
+class SessionCreateModel(BaseModel):
+    model_name: str
+    model_provider: str
+    system_prompt: str
+    allow_search: bool
+    use_multi_agent: Optional[bool] = False
+    agent_mode: Optional[str] = "sequential"
+    debate_research: Optional[str] = None
+    force_full_pipeline: Optional[bool] = None
+
+
+class TurnModel(BaseModel):
+    message: str  # only the new user message; earlier turns are kept on the server
+
+
+import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from ai_agent import aget_response_from_ai_agent, remember
+from multi_agent import MultiAgentOrchestrator, DEBATE_RESEARCH
+from graph import graph_names
+from router import choose_route, fast_model, ROUTED_SYSTEM_PROMPT
+from llm_registry import registry
+from concurrency import InFlightLimiter, InFlightLimitExceeded, SingleFlight
+from streaming import sse_event
+from response_cache import create_response_cache, cache_key
+from search_cache import search_cache
+from semantic_cache import SemanticCache, SEMANTIC_CACHE
+from batch import BatchRunner, read_jsonl
+from sessions import SessionStore, history_messages
+from memory import conversation_memory
+from hedging import hedge_policy
+from jobs import JobManager, JobQueueFull, PRIORITIES, FINISHED, JOB_MAX_WAIT
+from ratelimit import rate_limits, ProviderUnavailable, retry_after_header
+from instrumentation import UsageTracker
+from metrics import (metrics, requests_total, requests_in_flight, request_duration, phase_duration,
+                     record_provider_error)
 
 ALLOWED_MODEL_NAMES=["llama3-70b-8192", "groq/compound-mini", "llama-3.3-70b-versatile", "gemini-2.0-flash", "gemini-2.5-pro", "openai/gpt-oss-120b"]
 
-app = FastAPI(title="AI Agent")
+# Requests beyond MAX_IN_FLIGHT wait in a bounded queue, then get a 429
+MAX_IN_FLIGHT = int(os.environ.get("MAX_IN_FLIGHT", "32"))
+MAX_QUEUED = int(os.environ.get("MAX_QUEUED", "64"))
+QUEUE_TIMEOUT = float(os.environ.get("QUEUE_TIMEOUT", "10"))
+# Comma-separated providers whose SDKs are imported at startup instead of on the first request
+PRELOAD_PROVIDERS = [p.strip() for p in os.environ.get("PRELOAD_PROVIDERS", "").split(",") if p.strip()]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Active sessions live in memory; spill them so they survive a restart, under `uvicorn backend:app` too
+    session_store.flush()
+
+
+app = FastAPI(title="AI Agent", lifespan=lifespan)
+limiter = InFlightLimiter(MAX_IN_FLIGHT, max_queue=MAX_QUEUED, queue_timeout=QUEUE_TIMEOUT)
+response_cache = create_response_cache()
+semantic_cache = SemanticCache()
+# Identical requests arriving while one is running wait for its result
+singleflight = SingleFlight()
+session_store = SessionStore()
+# Shared by every /chat/batch upload, so concurrent batches together stay within BATCH_PROVIDER_CONCURRENCY
+batch_semaphores = {}
+
+if PRELOAD_PROVIDERS:
+    # Importing here (not only in __main__) also covers `uvicorn backend:app` workers
+    registry.preload(PRELOAD_PROVIDERS)
+
+
+@app.exception_handler(ProviderUnavailable)
+async def provider_unavailable_handler(request: Request, exc: ProviderUnavailable):
+    """Provider throttling (429) or an open circuit (503), instead of an opaque 500"""
+    return JSONResponse(status_code=exc.status_code, content={"detail": str(exc)},
+                        headers={"Retry-After": retry_after_header(exc)})
+
+
+def lookup_cache(request: RequestModel):
+    """Return (cached_response, headers); cached_response is None unless it is a hit"""
+    if response_cache is None:
+        return None, {}
+    if request.bypass_cache:
+        return None, {"X-Cache": "BYPASS"}
+    cached = response_cache.get(request)
+    if cached is None:
+        return None, {"X-Cache": "MISS"}
+    result, age = cached
+    return result, {"X-Cache": "HIT", "Age": str(int(age))}
+
+
+def store_cache(request: RequestModel, result):
+    if response_cache is not None:
+        response_cache.set(request, result)
+
+
+def request_labels(request: RequestModel, endpoint):
+    """Metric labels for a request; client-supplied values outside the known set become "unknown"
+    so /metrics cannot grow without bound"""
+    agent_mode = request.agent_mode or "sequential"
+    return {
+        "endpoint": endpoint,
+        "model_name": request.model_name if request.model_name in ALLOWED_MODEL_NAMES else "unknown",
+        "model_provider": request.model_provider if registry.has_provider(request.model_provider) else "unknown",
+        "agent_mode": ("single" if not request.use_multi_agent
+                       else agent_mode if agent_mode in graph_names() else "unknown"),
+        "allow_search": str(bool(request.allow_search)).lower(),
+    }
+
+
+async def observed_run_chat(request: RequestModel, endpoint, emit=None, history=None):
+    """run_chat with request, phase and provider-error metrics"""
+    labels = request_labels(request, endpoint)
+    requests_in_flight.inc(**labels)
+    started = time.perf_counter()
+    status = "error"
+    try:
+        result = await run_chat(request, emit=emit, history=history)
+        status = "error" if "error" in result else "ok"
+    except asyncio.CancelledError:
+        status = "cancelled"
+        raise
+    except Exception as e:
+        record_provider_error(e, labels["model_name"], labels["model_provider"])
+        raise
+    finally:
+        requests_in_flight.dec(**labels)
+        request_duration.observe(time.perf_counter() - started, **labels)
+        requests_total.inc(status=status, **labels)
+
+    for phase, seconds in result.get("timings", {}).get("phases", {}).items():
+        phase_duration.observe(seconds, phase=phase, **{k: v for k, v in labels.items() if k != "endpoint"})
+    return result
+
+
+def collect_gauges():
+    """Refresh scrape-time gauges from the limiter and caches"""
+    for name, value in limiter.stats().items():
+        limiter_gauge.set(value, stat=name)
+    if response_cache is not None:
+        for name, value in response_cache.stats().items():
+            cache_gauge.set(value, cache="response", stat=name)
+    for name, value in search_cache.stats().items():
+        cache_gauge.set(value, cache="search", stat=name)
+    for name, value in singleflight.stats().items():
+        cache_gauge.set(value, cache="coalescing", stat=name)
+    for name, value in conversation_memory.stats().items():
+        cache_gauge.set(value, cache="memory", stat=name)
+    for name, value in session_store.stats().items():
+        session_gauge.set(value, stat=name)
+    for name, value in hedge_policy.stats().items():
+        hedge_gauge.set(value, stat=name)
+    for name, value in job_manager.stats().items():
+        job_gauge.set(value, stat=name)
+
+
+limiter_gauge = metrics.gauge("chat_in_flight_limiter", "In-flight limiter state", ("stat",))
+cache_gauge = metrics.gauge("chat_cache", "Response/search cache and request coalescing counters", ("cache", "stat"))
+job_gauge = metrics.gauge("chat_jobs", "Background job workers and queue lengths", ("stat",))
+hedge_gauge = metrics.gauge("provider_hedging", "Hedge budget and hedge/failover counters", ("stat",))
+session_gauge = metrics.gauge("chat_sessions", "Conversation session store state", ("stat",))
+metrics.add_collector(collect_gauges)
 
 @app.post("/chat")
-def chat_endpoint(request: RequestModel):
+async def chat_endpoint(request: RequestModel, response: Response):
     """
     API Endpoint to interact with the Chatbot using LangGraph and search tools.
     It dynamically selects the model specified in the request
@@ -29,6 +191,239 @@ def chat_endpoint(request: RequestModel):
     if request.model_name not in ALLOWED_MODEL_NAMES:
         return {"error": "Model not allowed. Please choose a valid model."}
     
+    cached, cache_headers = lookup_cache(request)
+    response.headers.update(cache_headers)
+    if cached is not None:
+        requests_total.inc(status="cache_hit", **request_labels(request, "chat"))
+        return cached
+    
+    async def limited_run():
+        async with limiter.slot():
+            return await observed_run_chat(request, "chat")
+    
+    try:
+        result = await singleflight.do(cache_key(request), limited_run)
+    except InFlightLimitExceeded as e:
+        requests_total.inc(status="rejected", **request_labels(request, "chat"))
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    store_cache(request, result)
+    return result
+
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: RequestModel):
+    """
+    Same as /chat, but streams server-sent events as they happen: phase
+    events for each multi-agent phase transition (with the output of the
+    completed phase), token events while the answer is generated, then a
+    single result event with the full response.
+    """
+    if request.model_name not in ALLOWED_MODEL_NAMES:
+        return {"error": "Model not allowed. Please choose a valid model."}
+
+    cached, cache_headers = lookup_cache(request)
+
+    async def event_stream():
+        if cached is not None:
+            requests_total.inc(status="cache_hit", **request_labels(request, "stream"))
+            yield sse_event({"type": "result", "data": cached})
+            return
+        try:
+            async with limiter.slot():
+                queue = asyncio.Queue()
+                task = asyncio.create_task(observed_run_chat(request, "stream", emit=queue.put))
+                task.add_done_callback(lambda _: queue.put_nowait(None))
+                try:
+                    while (event := await queue.get()) is not None:
+                        yield sse_event(event)
+                    result = task.result()
+                    store_cache(request, result)
+                    yield sse_event({"type": "result", "data": result})
+                except ProviderUnavailable as e:
+                    yield sse_event({"type": "error", "status": e.status_code, "retry_after": retry_after_header(e),
+                                     "error": str(e)})
+                except Exception as e:
+                    yield sse_event({"type": "error", "error": str(e)})
+                finally:
+                    # Client went away or the pipeline failed: stop spending tokens
+                    task.cancel()
+        except InFlightLimitExceeded as e:
+            requests_total.inc(status="rejected", **request_labels(request, "stream"))
+            yield sse_event({"type": "error", "status": 429, "error": str(e)})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers=cache_headers)
+
+
+@app.post("/chat/batch")
+async def chat_batch_endpoint(http_request: Request, order: str = "input"):
+    """
+    Run a JSONL body of RequestModel records and stream JSONL results back,
+    in input order or in completion order (?order=completion).
+    """
+    try:
+        items = read_jsonl((await http_request.body()).decode("utf-8").splitlines())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid JSONL: {e}")
+
+    runner = BatchRunner(run_batch_record, semaphores=batch_semaphores)
+
+    async def result_lines():
+        async for entry in runner.run(items, order=order):
+            yield json.dumps(entry, default=str) + "\n"
+
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+
+async def run_batch_record(record):
+    """Run one batch record through the same caches and in-flight limit as /chat.
+
+    InFlightLimitExceeded propagates, so BatchRunner retries the record with backoff.
+    """
+    try:
+        request = RequestModel(**record)
+    except ValidationError as e:
+        return {"error": f"Invalid request: {e}"}
+    if request.model_name not in ALLOWED_MODEL_NAMES:
+        return {"error": "Model not allowed. Please choose a valid model."}
+    
+    cached, _ = lookup_cache(request)
+    if cached is not None:
+        return cached
+    async with limiter.slot():
+        result = await singleflight.do(cache_key(request), lambda: observed_run_chat(request, "batch"))
+    store_cache(request, result)
+    return result
+
+
+async def run_job(record, emit):
+    """Run a queued job's request through the same caches as /chat"""
+    request = RequestModel(**record)
+    cached, _ = lookup_cache(request)
+    if cached is not None:
+        return cached
+    result = await observed_run_chat(request, "jobs", emit=emit)
+    store_cache(request, result)
+    return result
+
+
+job_manager = JobManager(run_job)
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(request: RequestModel, priority: Optional[str] = None):
+    """
+    Queue a request and return its job id at once. priority is "interactive",
+    "default" or "batch"; by default single-agent requests are interactive
+    and multi-agent requests are default.
+    """
+    if request.model_name not in ALLOWED_MODEL_NAMES:
+        raise HTTPException(status_code=400, detail="Model not allowed. Please choose a valid model.")
+    priority = priority or ("default" if request.use_multi_agent else "interactive")
+    if priority not in PRIORITIES:
+        raise HTTPException(status_code=400, detail=f"priority must be one of {', '.join(PRIORITIES)}")
+    try:
+        job = await job_manager.submit(request.model_dump(), priority)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    return {"job_id": job["id"], "status": job["status"], "priority": priority}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """Job status, completed phases and result; ?wait=N long-polls up to N seconds for it to finish"""
+    if wait > 0:
+        job = await job_manager.wait(job_id, min(wait, JOB_MAX_WAIT))
+    else:
+        job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent phase and token events of a job, ending with a result or error event"""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for event in job_manager.events(job_id):
+            yield sse_event(event)
+        job = job_manager.get(job_id)
+        if job["status"] == "succeeded":
+            yield sse_event({"type": "result", "data": job["result"]})
+        elif job["status"] in FINISHED:
+            yield sse_event({"type": "error", "error": job["error"] or f"Job {job['status']}"})
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancel a queued or running job; async so job state is only touched on the event loop"""
+    if not job_manager.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Job not found or already finished")
+    return {"cancelled": job_id}
+
+
+@app.post("/sessions")
+def create_session(request: SessionCreateModel):
+    """Start a conversation; later turns only send the new message"""
+    if request.model_name not in ALLOWED_MODEL_NAMES:
+        return {"error": "Model not allowed. Please choose a valid model."}
+    session = session_store.create(request.model_dump())
+    return {"session_id": session["id"], "settings": session["settings"]}
+
+
+@app.post("/sessions/{session_id}/turns")
+async def session_turn_endpoint(session_id: str, turn: TurnModel):
+    """
+    Run one turn of a session in its agent mode, with the stored history as
+    context, and append the question and answer to the history.
+    """
+    async with session_store.turn_lock(session_id):
+        session = session_store.get(session_id)
+        if session is None:
+            raise HTTPException(status_code=404, detail="Session not found")
+        request = RequestModel(**session["settings"], messages=[turn.message])
+        try:
+            async with limiter.slot():
+                result = await observed_run_chat(request, "session", history=history_messages(session["turns"]))
+        except InFlightLimitExceeded as e:
+            requests_total.inc(status="rejected", **request_labels(request, "session"))
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+        if "error" not in result:
+            session = session_store.append(session_id, {"role": "user", "content": turn.message},
+                                           {"role": "assistant", "content": result["final_response"]})
+            if session is None:
+                # Deleted or expired while the turn ran; the turn lock only orders turns
+                raise HTTPException(status_code=410, detail="Session was deleted or expired during the turn")
+    return {"session_id": session_id, "turns": len(session["turns"]), **result}
+
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str, since: int = 0):
+    """Session settings and history; ?since=N returns only turns after the first N"""
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"session_id": session_id, "settings": session["settings"], "created_at": session["created_at"],
+            "updated_at": session["updated_at"], "total_turns": len(session["turns"]),
+            "turns": session["turns"][since:]}
+
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found")
+    return {"deleted": session_id}
+
+
+async def run_chat(request: RequestModel, emit=None, history=None):
+    """Run the single-agent or multi-agent pipeline for a validated request.
+
+    history holds earlier session turns as role/content messages.
+    """
     llm_id = request.model_name
     query = request.messages[0]
     allow_search = request.allow_search
@@ -39,21 +434,112 @@ def chat_endpoint(request: RequestModel):
 
     # Use multi-agent system if requested
     if use_multi_agent:
-        orchestrator = MultiAgentOrchestrator(llm_id, provider, allow_search)
+        use_semantic_cache = SEMANTIC_CACHE if request.semantic_cache is None else request.semantic_cache
+        mode = agent_mode or "sequential"
+        if mode not in graph_names():
+            return {"error": f"Unknown agent_mode. Choose one of: {', '.join(graph_names())}."}
+        route = None
+        if mode == "sequential":
+            # Simple queries take a cheaper path than the full pipeline
+            route, reason = choose_route(query, allow_search, request.force_full_pipeline)
+            if route in ("fast", "single"):
+                return await run_routed(request, route, reason, emit=emit, history=history)
+            mode = "sequential" if route == "full" else route
+        # Follow-up questions depend on the conversation, so sessions skip the semantic cache
+        use_semantic_cache = use_semantic_cache and not history
+        if use_semantic_cache and not request.bypass_cache:
+            match = semantic_cache.lookup(query, provider, llm_id, mode, allow_search)
+            if match is not None:
+                cached, similarity, matched_query = match
+                return {
+                    **cached,
+                    "steps": [],
+                    "metadata": {
+                        "mode": mode,
+                        "search_enabled": allow_search,
+                        "semantic_cache": {"hit": True, "similarity": round(similarity, 4), "matched_query": matched_query},
+                        **({"route": route, "route_reason": reason} if route else {})
+                    }
+                }
+        
+        # Every agent of the pipeline gets the history, so it is held to the model's memory budget like single-agent turns
+        context, memory_stats = conversation_memory.prepare(history, llm_id) if history else (None, None)
+        orchestrator = MultiAgentOrchestrator(llm_id, provider, allow_search, emit=emit,
+                                              debate_research=request.debate_research or DEBATE_RESEARCH,
+                                              history=context)
         
-        # Choose between debate mode and sequential mode
-        if agent_mode == "debate":
-            result = orchestrator.debate_mode(query)
-        else:
-            result = orchestrator.process_query(query)
+        result = await orchestrator.arun_graph(mode, query)
+        if route:
+            result["metadata"].update(route=route, route_reason=reason)
+        if history:
+            result["memory"] = memory_stats
+            remember(llm_id, provider, [*history, query], result["final_response"], memory_stats, None)
         
+        if use_semantic_cache:
+            semantic_cache.store(query, provider, llm_id, mode, allow_search, result)
         return result
     else:
         # Use single agent (existing functionality)
-        response = get_response_from_ai_agent(llm_id, request.messages, allow_search, system_prompt, provider)
-        return {"final_response": response}
+        tracker = UsageTracker()
+        messages = (history or []) + request.messages
+        response = await aget_response_from_ai_agent(llm_id, messages, allow_search, system_prompt, provider,
+                                                     emit=emit, tracker=tracker)
+        return {"final_response": response, **tracker.summary()}
+
+
+async def run_routed(request: RequestModel, route, reason, emit=None, history=None):
+    """Answer a routed multi-agent request with one agent call instead of the pipeline"""
+    llm_id = fast_model(request.model_provider, request.model_name) if route == "fast" else request.model_name
+    allow_search = request.allow_search and route == "single"
+    tracker = UsageTracker()
+    messages = (history or []) + request.messages
+    response = await aget_response_from_ai_agent(llm_id, messages, allow_search, ROUTED_SYSTEM_PROMPT,
+                                                 request.model_provider, emit=emit, tracker=tracker)
+    summary = tracker.summary()
+    metadata = {**summary.pop("metadata", {}), "mode": "sequential", "search_enabled": allow_search,
+                "route": route, "route_reason": reason, "model": llm_id, "total_agents": 1}
+    return {"final_response": response, "steps": [], "metadata": metadata, **summary}
+
+
+@app.get("/graphs")
+def list_graphs():
+    """Pipeline graphs available as agent_mode"""
+    return {"agent_modes": graph_names()}
+
+
+@app.get("/registry/stats")
+def registry_stats():
+    """Hit/miss counters for the shared LLM client and agent caches, plus hedging and rate-limit state"""
+    return {**registry.stats(), "hedging": hedge_policy.stats(), "rate_limits": rate_limits.stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics_endpoint():
+    """Prometheus text exposition of request, phase, provider and cache metrics"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+def cache_stats():
+    """Hit/miss counters for the /chat response cache and the web search cache"""
+    responses = {"enabled": False} if response_cache is None else {"enabled": True, **response_cache.stats()}
+    return {"responses": responses, "search": search_cache.stats(), "semantic": semantic_cache.stats(),
+            "coalescing": singleflight.stats(), "sessions": session_store.stats(),
+            "memory": conversation_memory.stats()}
 
 
 if __name__ == "__main__":
+    import argparse
+    import logging
     import uvicorn
-    uvicorn.run(app, host="127.0.0.1", port=9999)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Run the AI agent backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9999)
+    parser.add_argument("--preload", default="",
+                        help="comma-separated providers to import before serving, e.g. Groq,Gemini")
+    args = parser.parse_args()
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO"), format="%(asctime)s %(name)s %(message)s")
+    preload = [p.strip() for p in args.preload.split(",") if p.strip()]
+    if preload:
+        logging.getLogger(__name__).info("Preloaded %s", ", ".join(registry.preload(preload)))
+    uvicorn.run(app, host=args.host, port=args.port)
\ No newline at end of file
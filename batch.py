@@ -0,0 +1,157 @@
+"""Batch execution of RequestModel records.
+
+Used by the /chat/batch endpoint and as an offline CLI:
+
+    python batch.py requests.jsonl --output results.jsonl --order completion
+
+Each input line is a JSON RequestModel. Each output line is
+{"index", "status", "attempts", "result" | "error"}. Re-running with the same
+--output resumes the batch: items already recorded with status "ok" are skipped
+and failed items are tried again.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+
+BATCH_PROVIDER_CONCURRENCY = int(os.environ.get("BATCH_PROVIDER_CONCURRENCY", "4"))
+BATCH_MAX_RETRIES = int(os.environ.get("BATCH_MAX_RETRIES", "3"))
+BATCH_RETRY_BASE_DELAY = float(os.environ.get("BATCH_RETRY_BASE_DELAY", "1.0"))
+
+
+def read_jsonl(lines):
+    """Parse JSONL lines into (index, record) pairs, skipping blank lines; raises ValueError on a bad line"""
+    items = []
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line:
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError(f"line {number} is not a JSON object")
+            items.append((len(items), record))
+    return items
+
+
+def completed_indexes(path):
+    """Indexes already recorded as successful in an existing output file"""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by an interrupted run
+                continue
+            if entry.get("status") == "ok":
+                done.add(entry["index"])
+    return done
+
+
+class BatchRunner:
+    """Runs records with bounded concurrency per provider and retries failures.
+
+    run_one is an async callable taking a record dict and returning a result
+    dict; exceptions are retried with jittered exponential backoff, results
+    containing an "error" key are reported as failed without retrying.
+    semaphores maps providers to their semaphores; passing one dict to every
+    runner caps the provider concurrency of all of them together.
+    """
+
+    def __init__(self, run_one, provider_concurrency=BATCH_PROVIDER_CONCURRENCY,
+                 max_retries=BATCH_MAX_RETRIES, retry_base_delay=BATCH_RETRY_BASE_DELAY, semaphores=None):
+        self.run_one = run_one
+        self.provider_concurrency = provider_concurrency
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._semaphores = {} if semaphores is None else semaphores
+
+    def _semaphore(self, provider):
+        if provider not in self._semaphores:
+            self._semaphores[provider] = asyncio.Semaphore(self.provider_concurrency)
+        return self._semaphores[provider]
+
+    async def _run_with_retries(self, index, record):
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                async with self._semaphore(record.get("model_provider")):
+                    result = await self.run_one(record)
+            except Exception as e:
+                if attempt > self.max_retries:
+                    return {"index": index, "status": "error", "attempts": attempt, "error": str(e)}
+                delay = self.retry_base_delay * 2 ** (attempt - 1)
+                await asyncio.sleep(random.uniform(0, delay))
+                continue
+            if "error" in result:
+                return {"index": index, "status": "error", "attempts": attempt, "error": result["error"]}
+            return {"index": index, "status": "ok", "attempts": attempt, "result": result}
+
+    async def run(self, items, order="input"):
+        """Yield one output entry per (index, record) item.
+
+        order="input" yields in input order, buffering results that finish
+        early; order="completion" yields each result as soon as it is ready.
+        """
+        queue = asyncio.Queue()
+
+        async def worker(index, record):
+            await queue.put(await self._run_with_retries(index, record))
+
+        tasks = [asyncio.create_task(worker(index, record)) for index, record in items]
+        pending_order = [index for index, _ in items]
+        buffered = {}
+        try:
+            for _ in range(len(tasks)):
+                entry = await queue.get()
+                if order == "completion":
+                    yield entry
+                    continue
+                buffered[entry["index"]] = entry
+                while pending_order and pending_order[0] in buffered:
+                    yield buffered.pop(pending_order.pop(0))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+
+async def run_file(input_path, output_path, order="input", **runner_options):
+    """Run a JSONL batch in-process, appending results to output_path"""
+    from backend import run_batch_record
+
+    with open(input_path, encoding="utf-8") as f:
+        items = read_jsonl(f)
+    done = completed_indexes(output_path)
+    items = [(index, record) for index, record in items if index not in done]
+    print(f"{len(done)} already completed, {len(items)} to run")
+
+    runner = BatchRunner(run_batch_record, **runner_options)
+    failed = 0
+    with open(output_path, "a", encoding="utf-8") as out:
+        async for entry in runner.run(items, order=order):
+            # Flushed per line so an interrupted run can resume from here
+            out.write(json.dumps(entry, default=str) + "\n")
+            out.flush()
+            failed += entry["status"] != "ok"
+    print(f"Finished: {len(items) - failed} succeeded, {failed} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a JSONL file of /chat requests")
+    parser.add_argument("input", help="JSONL file with one RequestModel per line")
+    parser.add_argument("--output", "-o", required=True, help="JSONL results file, also the resume checkpoint")
+    parser.add_argument("--order", choices=("input", "completion"), default="input")
+    parser.add_argument("--concurrency", type=int, default=BATCH_PROVIDER_CONCURRENCY,
+                        help="concurrent requests per provider")
+    parser.add_argument("--retries", type=int, default=BATCH_MAX_RETRIES)
+    args = parser.parse_args()
+
+    asyncio.run(run_file(args.input, args.output, order=args.order,
+                         provider_concurrency=args.concurrency, max_retries=args.retries))
+
+
+if __name__ == "__main__":
+    main()
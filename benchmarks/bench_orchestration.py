@@ -0,0 +1,201 @@
+"""Offline benchmark of the agent orchestration layer.
+
+Runs get_response_from_ai_agent, process_query and debate_mode against the
+fake chat model and fake search tool from benchmarks/fakes.py and reports:
+
+- overhead_ms:    wall time per request with zero simulated provider latency,
+                  i.e. agent construction, message handling and prompt assembly
+- throughput_rps: completed requests per second at --concurrency in-flight
+                  requests with simulated provider latency
+- memory_kb:      peak Python heap allocated while serving one request
+
+Every measurement is repeated --repeats times and the median is reported,
+along with its spread (relative median absolute deviation, scaled to match a
+standard deviation). The regression gate checks overhead_p50_ms, memory_kb
+and throughput_rps; a metric fails only if it is worse by more than both
+--tolerance and SPREAD_FACTOR times the larger of the baseline's and the
+current run's spread, so a noisy machine widens the gate instead of failing
+it. Throughput depends on the load settings, so it is only gated when they
+match the ones the baselines were recorded with.
+
+Usage:
+    python -m benchmarks.bench_orchestration                  # compare to baselines.json
+    python -m benchmarks.bench_orchestration --save-baseline  # record new baselines
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_registry import registry
+from ai_agent import aget_response_from_ai_agent
+from multi_agent import MultiAgentOrchestrator
+from benchmarks.fakes import install_fakes, FAKE_MODEL
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+SCENARIOS = ("single", "sequential", "debate")
+METRICS = ("overhead_ms", "overhead_p50_ms", "throughput_rps", "memory_kb")
+# Metrics checked by the gate, and whether a higher value is worse
+GATED = (("overhead_p50_ms", True), ("memory_kb", True), ("throughput_rps", False))
+SPREAD_FACTOR = 3.0
+# Options that change what throughput_rps measures
+LOAD_SETTINGS = ("requests", "concurrency", "latency", "tokens_per_second")
+
+_query_ids = itertools.count()
+
+
+def _query():
+    # Unique queries so the search cache does not hide the work being measured
+    return f"Should teams adopt technology {next(_query_ids)} this year?"
+
+
+async def run_scenario(scenario, provider, allow_search=True):
+    if scenario == "single":
+        return await aget_response_from_ai_agent(FAKE_MODEL, [_query()], allow_search,
+                                                 "Act as an AI chatbot who is smart and friendly", provider)
+    orchestrator = MultiAgentOrchestrator(FAKE_MODEL, provider, allow_search)
+    if scenario == "debate":
+        return await orchestrator.adebate_mode(_query())
+    return await orchestrator.aprocess_query(_query())
+
+
+async def measure_overhead(scenario, requests):
+    provider = install_fakes(registry, {"first_token_latency": 0.0, "tokens_per_second": 0.0})
+    await run_scenario(scenario, provider)  # warm the agent cache
+    durations = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await run_scenario(scenario, provider)
+        durations.append(time.perf_counter() - started)
+    return statistics.mean(durations) * 1000, statistics.median(durations) * 1000
+
+
+async def measure_throughput(scenario, concurrency, requests, latency, tokens_per_second):
+    provider = install_fakes(registry, {"first_token_latency": latency, "tokens_per_second": tokens_per_second},
+                             search_latency=latency)
+    await run_scenario(scenario, provider)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await run_scenario(scenario, provider)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    return requests / (time.perf_counter() - started)
+
+
+async def measure_memory(scenario, requests=5):
+    provider = install_fakes(registry, {"first_token_latency": 0.0, "tokens_per_second": 0.0})
+    await run_scenario(scenario, provider)
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            tracemalloc.reset_peak()
+            baseline, _ = tracemalloc.get_traced_memory()
+            await run_scenario(scenario, provider)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+    return statistics.median(peaks) / 1024
+
+
+async def run_round(scenario, args):
+    overhead_mean, overhead_median = await measure_overhead(scenario, args.requests)
+    throughput = await measure_throughput(scenario, args.concurrency, args.requests * 2,
+                                          args.latency, args.tokens_per_second)
+    memory = await measure_memory(scenario)
+    return {"overhead_ms": overhead_mean, "overhead_p50_ms": overhead_median, "throughput_rps": throughput,
+            "memory_kb": memory}
+
+
+def relative_spread(values):
+    """Median absolute deviation relative to the median, scaled to estimate a standard deviation"""
+    median = statistics.median(values)
+    if not median or len(values) < 2:
+        return 0.0
+    return 1.4826 * statistics.median(abs(v - median) for v in values) / median
+
+
+async def run_benchmarks(args):
+    results = {}
+    for scenario in args.scenarios:
+        rounds = [await run_round(scenario, args) for _ in range(args.repeats)]
+        medians = {metric: statistics.median(r[metric] for r in rounds) for metric in METRICS}
+        results[scenario] = {metric: round(value, 3) for metric, value in medians.items()}
+        results[scenario]["spread"] = {metric: round(relative_spread([r[metric] for r in rounds]), 3)
+                                       for metric in METRICS}
+        print(f"{scenario:>10}: overhead {medians['overhead_ms']:8.2f} ms (p50 {medians['overhead_p50_ms']:.2f}) | "
+              f"{medians['throughput_rps']:8.2f} req/s at {args.concurrency} concurrent | "
+              f"{medians['memory_kb']:8.1f} KB/request | median of {args.repeats}")
+    return results
+
+
+def compare(results, baselines, tolerance, settings=None):
+    """Return a list of regressions beyond both tolerance (a fraction, e.g. 0.25) and the observed noise"""
+    regressions = []
+    same_load = settings is not None and baselines.get("settings") == settings
+    if not same_load:
+        print("Load settings differ from the baselines'; throughput_rps is not gated")
+    for scenario, current in results.items():
+        base = baselines.get(scenario)
+        if not base:
+            continue
+        for metric, higher_is_worse in GATED:
+            if metric == "throughput_rps" and not same_load:
+                continue
+            old, new = base.get(metric), current.get(metric)
+            if not old or new is None:
+                continue
+            spread = max(base.get("spread", {}).get(metric, 0.0), current.get("spread", {}).get(metric, 0.0))
+            allowed = max(tolerance, SPREAD_FACTOR * spread)
+            change = (new - old) / old if higher_is_worse else (old - new) / old
+            if change > allowed:
+                regressions.append(f"{scenario} {metric}: {old} -> {new} ({change:+.0%} worse, allowed {allowed:.0%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline orchestration benchmark with fake LLM and search")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=20, help="requests per overhead measurement")
+    parser.add_argument("--repeats", type=int, default=5, help="rounds per scenario; medians are reported")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.2, help="simulated first-token latency in seconds")
+    parser.add_argument("--tokens-per-second", type=float, default=2000.0)
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression before failing")
+    parser.add_argument("--save-baseline", action="store_true", help=f"write results to {BASELINE_PATH}")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_benchmarks(args))
+    settings = {name: getattr(args, name) for name in LOAD_SETTINGS}
+
+    if args.save_baseline:
+        with open(BASELINE_PATH, "w", encoding="utf-8") as f:
+            json.dump({**results, "settings": settings}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baselines saved to {BASELINE_PATH}")
+        return
+
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance, settings)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
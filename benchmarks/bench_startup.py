@@ -0,0 +1,74 @@
+"""Cold-start benchmark for the backend.
+
+Imports backend in fresh interpreters under ``python -X importtime`` and
+reports total import time plus the slowest top-level packages, once cold
+(provider SDKs load on first request) and once with PRELOAD_PROVIDERS set
+(SDKs load at startup, as `python backend.py --preload Groq,Gemini` does).
+
+Usage:
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --preload Groq,Gemini --top 15
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_profile(module, env=None):
+    """Return (total_seconds, {top-level package: self seconds}) for one fresh import"""
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=ROOT, env={**os.environ, **(env or {})},
+                               capture_output=True, text=True, check=True)
+    packages = defaultdict(float)
+    total = 0.0
+    for line in completed.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        packages[name.split(".")[0]] += int(self_us) / 1e6
+        if name == module and not indent:
+            total = int(cumulative_us) / 1e6
+    return total, packages
+
+
+def measure(module, runs, env=None):
+    totals, packages = [], defaultdict(list)
+    for _ in range(runs):
+        total, per_package = import_profile(module, env)
+        totals.append(total)
+        for name, seconds in per_package.items():
+            packages[name].append(seconds)
+    return statistics.median(totals), {name: statistics.median(values) for name, values in packages.items()}
+
+
+def report(label, total, packages, top):
+    print(f"{label}: import backend {total * 1000:.0f} ms (median)")
+    for name, seconds in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure backend import time, cold vs with preloaded providers")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--preload", default="Groq,Gemini", help="providers for the preloaded measurement")
+    parser.add_argument("--top", type=int, default=10, help="number of packages to list")
+    args = parser.parse_args()
+
+    cold_total, cold_packages = measure("backend", args.runs, {"PRELOAD_PROVIDERS": ""})
+    report("cold", cold_total, cold_packages, args.top)
+    warm_total, warm_packages = measure("backend", args.runs, {"PRELOAD_PROVIDERS": args.preload})
+    report(f"preload {args.preload}", warm_total, warm_packages, args.top)
+    print(f"Deferred to first request without preload: {(warm_total - cold_total) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
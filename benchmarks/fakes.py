@@ -0,0 +1,143 @@
+"""Deterministic offline stand-ins for the chat providers and TavilySearch.
+
+Latency is simulated as first_token_latency + output_tokens / tokens_per_second,
+so benchmarks can separate orchestration overhead (latency set to zero) from
+provider-bound throughput.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, List, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.tools import BaseTool
+
+FAKE_PROVIDER = "Fake"
+FAKE_MODEL = "fake-model"
+
+
+def _estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model that answers deterministically after a simulated delay.
+
+    With tool_calls=True and tools bound, the first turn of each agent run
+    asks for the first bound tool with the user's message as the query, and
+    the answer comes after the tool result, like a real search-using agent.
+    """
+
+    first_token_latency: float = 0.0
+    tokens_per_second: float = 0.0  # 0 means instant generation
+    output_tokens: int = 200
+    tool_calls: bool = True
+    bound_tool_names: List[str] = []
+    error: Optional[BaseException] = None
+
+    @property
+    def _llm_type(self):
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [getattr(t, "name", None) or t.get("name") for t in tools]
+        return self.model_copy(update={"bound_tool_names": names})
+
+    def _delay(self):
+        if self.tokens_per_second:
+            return self.first_token_latency + self.output_tokens / self.tokens_per_second
+        return self.first_token_latency
+
+    def _reply(self, messages):
+        if self.error is not None:
+            raise self.error
+        prompt = "\n".join(str(m.content) for m in messages)
+        input_tokens = _estimate_tokens(prompt)
+        wants_tool = self.tool_calls and self.bound_tool_names and not any(isinstance(m, ToolMessage) for m in messages)
+        if wants_tool:
+            query = str(messages[-1].content)[:200]
+            call_id = hashlib.md5(prompt.encode("utf-8")).hexdigest()[:12]
+            return AIMessage(
+                content="",
+                tool_calls=[{"name": self.bound_tool_names[0], "args": {"query": query}, "id": call_id}],
+                usage_metadata={"input_tokens": input_tokens, "output_tokens": 10, "total_tokens": input_tokens + 10},
+            )
+        digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        words = [f"point-{digest[i % 60:i % 60 + 4]}" for i in range(self.output_tokens)]
+        content = "- " + " ".join(words) + " (Source: https://example.com/fake)"
+        return AIMessage(
+            content=content,
+            usage_metadata={"input_tokens": input_tokens, "output_tokens": self.output_tokens,
+                            "total_tokens": input_tokens + self.output_tokens},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self._delay())
+        return ChatResult(generations=[ChatGeneration(message=self._reply(messages))])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        message = self._reply(messages)
+        await asyncio.sleep(self.first_token_latency)
+        if message.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(
+                content="", tool_call_chunks=[{"name": c["name"], "args": '{"query": "%s"}' % c["args"]["query"].replace('"', ""),
+                                               "id": c["id"], "index": 0} for c in message.tool_calls],
+                usage_metadata=message.usage_metadata))
+            return
+        per_token = 1 / self.tokens_per_second if self.tokens_per_second else 0
+        words = message.content.split(" ")
+        for i, word in enumerate(words):
+            if per_token:
+                await asyncio.sleep(per_token)
+            text = word if i == len(words) - 1 else word + " "
+            chunk = ChatGenerationChunk(message=AIMessageChunk(
+                content=text, usage_metadata=message.usage_metadata if i == 0 else None))
+            if run_manager:
+                await run_manager.on_llm_new_token(text, chunk=chunk)
+            yield chunk
+
+
+class FakeSearchTool(BaseTool):
+    """TavilySearch stand-in returning deterministic results after a simulated delay"""
+
+    name: str = "tavily_search"
+    description: str = "Search the web for current information. Input should be a search query."
+    max_results: int = 2
+    latency: float = 0.0
+    calls: int = 0
+
+    def _results(self, query):
+        self.calls += 1
+        return {
+            "query": query,
+            "results": [
+                {"title": f"Result {i} for {query[:40]}", "url": f"https://example.com/{i}",
+                 "content": f"Fact {i} about {query[:80]}: 42% of surveyed teams agree (2024)."}
+                for i in range(self.max_results)
+            ],
+        }
+
+    def _run(self, query: str, **kwargs: Any):
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def _arun(self, query: str, **kwargs: Any):
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+
+def install_fakes(registry, llm_options=None, search_latency=0.0):
+    """Point the LLM registry at the fakes; returns the provider name to request"""
+    llm_options = llm_options or {}
+    registry.register_provider(FAKE_PROVIDER, lambda llm_id: FakeChatModel(**llm_options))
+    registry.set_search_factory(lambda max_results: FakeSearchTool(max_results=max_results, latency=search_latency))
+    # Drop clients built with earlier options
+    with registry._lock:
+        registry._llms = {k: v for k, v in registry._llms.items() if k[0] != FAKE_PROVIDER}
+    return FAKE_PROVIDER
@@ -0,0 +1,288 @@
+"""Load-replay harness for the FastAPI backend.
+
+Replays recorded (JSONL of RequestModel) or synthetic /chat traffic against
+backend.app, either in-process through an ASGI transport or over localhost
+through a uvicorn server started in a background thread. The backend runs
+against the fake provider from benchmarks/fakes.py, so no API keys or
+network access are needed.
+
+Each load level reports the latency distribution, error and 429 rates, and
+achieved vs offered throughput; the saturation point is the first level where
+the backend stops keeping up.
+
+Examples:
+    # open loop: Poisson arrivals at increasing rates, mostly debates
+    python -m benchmarks.load_replay --model open --rates 2 4 8 16 32 --mix single=1 sequential=1 debate=3
+    # closed loop: N concurrent users, each sending a request as soon as the last returns
+    python -m benchmarks.load_replay --model closed --users 8 16 32 64 --duration 20 --transport localhost
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import backend
+from concurrency import InFlightLimiter
+from llm_registry import registry
+from benchmarks.fakes import install_fakes, FAKE_MODEL
+
+MODES = {
+    "single": {"use_multi_agent": False, "agent_mode": "sequential"},
+    # The synthetic queries are short; forcing the full pipeline keeps this scenario measuring it
+    "sequential": {"use_multi_agent": True, "agent_mode": "sequential", "force_full_pipeline": True},
+    "debate": {"use_multi_agent": True, "agent_mode": "debate"},
+}
+
+
+def parse_mix(pairs):
+    mix = {}
+    for pair in pairs:
+        mode, _, weight = pair.partition("=")
+        if mode not in MODES:
+            raise SystemExit(f"Unknown mode in --mix: {mode}")
+        mix[mode] = float(weight or 1)
+    return mix
+
+
+class TrafficSource:
+    """Yields request payloads, from a recording or synthesized from a mode mix"""
+
+    def __init__(self, mix, replay_path=None, allow_search=True, seed=0):
+        self.random = random.Random(seed)
+        self.mix = mix
+        self.allow_search = allow_search
+        self.recorded = []
+        if replay_path:
+            with open(replay_path, encoding="utf-8") as f:
+                self.recorded = [json.loads(line) for line in f if line.strip()]
+        self._counter = itertools.count()
+
+    def next(self):
+        n = next(self._counter)
+        if self.recorded:
+            payload = dict(self.recorded[n % len(self.recorded)])
+            # Recorded traffic is replayed against the stand-in provider
+            payload.update(model_name=FAKE_MODEL, model_provider="Fake")
+            payload["messages"] = [f"{m} [{n}]" for m in payload.get("messages", [])] or [f"query {n}"]
+            return payload
+        modes, weights = zip(*self.mix.items())
+        mode = self.random.choices(modes, weights)[0]
+        return {
+            "model_name": FAKE_MODEL,
+            "model_provider": "Fake",
+            "system_prompt": "Act as an AI chatbot who is smart and friendly",
+            # Unique text so caches and request coalescing do not hide load
+            "messages": [f"Is technology {n} worth adopting for a team of {n % 50 + 2}?"],
+            "allow_search": self.allow_search,
+            **MODES[mode],
+        }
+
+
+async def send(client, payload, samples):
+    """Send one request, appending (latency, status) to samples; returns the status"""
+    started = time.perf_counter()
+    try:
+        response = await client.post("/chat", json=payload)
+        status = response.status_code
+        if status == 200 and "error" in response.json():
+            status = "error"
+    except Exception as e:
+        status = type(e).__name__
+    samples.append((time.perf_counter() - started, status))
+    return status
+
+
+async def open_loop(client, source, rate, duration):
+    """Poisson arrivals at rate requests/second, independent of response times"""
+    samples, tasks = [], []
+    deadline = time.perf_counter() + duration
+    rng = random.Random(1)
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(send(client, source.next(), samples)))
+        await asyncio.sleep(rng.expovariate(rate))
+    await asyncio.gather(*tasks)
+    return samples
+
+
+async def closed_loop(client, source, users, duration, think_time, retry_wait):
+    """users concurrent clients, each waiting think_time between its requests
+    and retry_wait after a 429"""
+    samples = []
+    deadline = time.perf_counter() + duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            status = await send(client, source.next(), samples)
+            if status == 429 and retry_wait:
+                await asyncio.sleep(retry_wait)
+            elif think_time:
+                await asyncio.sleep(think_time)
+
+    await asyncio.gather(*(user() for _ in range(users)))
+    return samples
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def summarize(level, samples, elapsed, offered=None):
+    latencies = [seconds for seconds, status in samples if status == 200]
+    total = len(samples)
+    rejected = sum(1 for _, status in samples if status == 429)
+    errors = total - len(latencies) - rejected
+    return {
+        "level": level,
+        "requests": total,
+        "offered_rps": offered,
+        "achieved_rps": round(len(latencies) / elapsed, 2) if elapsed else 0,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "mean": statistics.mean(latencies) if latencies else None,
+        "error_rate": errors / total if total else 0,
+        "rate_429": rejected / total if total else 0,
+    }
+
+
+def is_saturated(summary, slo_p95, max_reject_rate):
+    if summary["rate_429"] > max_reject_rate or summary["error_rate"] > max_reject_rate:
+        return True
+    if summary["p95"] is not None and summary["p95"] > slo_p95:
+        return True
+    offered = summary["offered_rps"]
+    return offered is not None and summary["achieved_rps"] < 0.9 * offered
+
+
+class LocalServer:
+    """uvicorn serving backend.app on a free localhost port in a background thread"""
+
+    def __init__(self):
+        import uvicorn
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            self.port = s.getsockname()[1]
+        config = uvicorn.Config(backend.app, host="127.0.0.1", port=self.port, log_level="warning")
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return f"http://127.0.0.1:{self.port}"
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+def configure_backend(args):
+    install_fakes(registry, {"first_token_latency": args.latency, "tokens_per_second": args.tokens_per_second},
+                  search_latency=args.latency)
+    if FAKE_MODEL not in backend.ALLOWED_MODEL_NAMES:
+        backend.ALLOWED_MODEL_NAMES.append(FAKE_MODEL)
+    backend.response_cache = None
+    if args.max_in_flight:
+        backend.limiter = InFlightLimiter(args.max_in_flight, max_queue=args.max_queued,
+                                          queue_timeout=args.queue_timeout)
+
+
+async def run_levels(args, base_url=None):
+    source = TrafficSource(parse_mix(args.mix), args.replay, allow_search=not args.no_search)
+    if base_url:
+        client = httpx.AsyncClient(base_url=base_url, timeout=args.timeout,
+                                   limits=httpx.Limits(max_connections=None, max_keepalive_connections=None))
+    else:
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=backend.app), base_url="http://backend",
+                                   timeout=args.timeout)
+    levels = args.rates if args.model == "open" else args.users
+    results = []
+    saturation = None
+    async with client:
+        for level in levels:
+            started = time.perf_counter()
+            if args.model == "open":
+                samples = await open_loop(client, source, level, args.duration)
+            else:
+                samples = await closed_loop(client, source, level, args.duration, args.think_time, args.retry_wait)
+            if args.model == "open":
+                # Completions per second of arrivals; a growing backlog shows up as rising latency
+                summary = summarize(level, samples, args.duration, offered=level)
+            else:
+                summary = summarize(level, samples, time.perf_counter() - started)
+            results.append(summary)
+            print(format_summary(args.model, summary))
+            if saturation is None and is_saturated(summary, args.slo_p95, args.max_reject_rate):
+                saturation = level
+                if not args.keep_going:
+                    break
+    return results, saturation
+
+
+def format_summary(model, s):
+    def ms(value):
+        return f"{value * 1000:8.0f}" if value is not None else "       -"
+    label = f"{s['level']:>6} rps" if model == "open" else f"{s['level']:>4} users"
+    return (f"{label}: {s['requests']:5d} req | {s['achieved_rps']:7.2f} ok/s | p50 {ms(s['p50'])} ms | "
+            f"p95 {ms(s['p95'])} ms | p99 {ms(s['p99'])} ms | err {s['error_rate']:.1%} | 429 {s['rate_429']:.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay /chat traffic against backend.app with a fake provider")
+    parser.add_argument("--model", choices=("open", "closed"), default="closed", help="open- or closed-loop load")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8, 16, 32], help="open loop: requests/s")
+    parser.add_argument("--users", type=int, nargs="+", default=[4, 8, 16, 32, 64, 128], help="closed loop: users")
+    parser.add_argument("--think-time", type=float, default=0.0, help="closed loop: pause between a user's requests")
+    parser.add_argument("--retry-wait", type=float, default=1.0, help="closed loop: pause after a 429")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per load level")
+    parser.add_argument("--mix", nargs="+", default=["single=1", "sequential=1", "debate=1"],
+                        help="mode weights, e.g. single=2 debate=1")
+    parser.add_argument("--replay", help="JSONL file of recorded RequestModel payloads")
+    parser.add_argument("--no-search", action="store_true", help="send allow_search=false")
+    parser.add_argument("--transport", choices=("inprocess", "localhost"), default="inprocess")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake provider first-token latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=500.0)
+    parser.add_argument("--max-in-flight", type=int, help="override the backend in-flight limit")
+    parser.add_argument("--max-queued", type=int, default=backend.MAX_QUEUED)
+    parser.add_argument("--queue-timeout", type=float, default=backend.QUEUE_TIMEOUT)
+    parser.add_argument("--timeout", type=float, default=120.0, help="client timeout per request")
+    parser.add_argument("--slo-p95", type=float, default=10.0, help="p95 latency (s) counted as saturated")
+    parser.add_argument("--max-reject-rate", type=float, default=0.01, help="429/error rate counted as saturated")
+    parser.add_argument("--keep-going", action="store_true", help="run every level even after saturation")
+    parser.add_argument("--output", help="write per-level results as JSON")
+    args = parser.parse_args()
+
+    configure_backend(args)
+    if args.transport == "localhost":
+        with LocalServer() as base_url:
+            results, saturation = asyncio.run(run_levels(args, base_url))
+    else:
+        results, saturation = asyncio.run(run_levels(args))
+
+    unit = "rps" if args.model == "open" else "concurrent users"
+    if saturation is None:
+        print(f"No saturation up to {results[-1]['level']} {unit}")
+    else:
+        print(f"Saturation point: {saturation} {unit}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"levels": results, "saturation": saturation}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import re
+
+COMPACTION = os.environ.get("COMPACTION", "on") == "on"
+
+# Input-token budget for the research/analysis context handed to later agents
+DEFAULT_CONTEXT_BUDGET = int(os.environ.get("COMPACTION_BUDGET", "1500"))
+MODEL_CONTEXT_BUDGETS = {
+    "groq/compound-mini": 800,
+    "llama3-70b-8192": 1200,
+    "gemini-2.5-pro": 3000,
+}
+
+_URL_RE = re.compile(r"https?://[^\s)\]>,]+")
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+")
+
+
+def estimate_tokens(text):
+    """Rough token count (about four characters per token), no tokenizer needed"""
+    return (len(text) + 3) // 4
+
+
+def context_budget(llm_id):
+    return MODEL_CONTEXT_BUDGETS.get(llm_id, DEFAULT_CONTEXT_BUDGET)
+
+
+def _units(text):
+    """Split text into lines, and long lines into sentences"""
+    units = []
+    for line in text.splitlines():
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        if estimate_tokens(line) > 60 and not _BULLET_RE.match(line):
+            units.extend(part for part in _SENTENCE_RE.split(line) if part.strip())
+        else:
+            units.append(line)
+    return units
+
+
+def _words(text):
+    return set(_WORD_RE.findall(_URL_RE.sub(" ", text.lower())))
+
+
+def _is_heading(unit):
+    stripped = unit.strip()
+    return stripped.startswith("#") or (stripped.endswith(":") and len(stripped) < 60)
+
+
+def compact(text, budget, query=""):
+    """Extractively shrink text to roughly budget tokens.
+
+    Duplicate and near-duplicate points are dropped first. If that is not
+    enough, the points least related to the query are dropped, favouring
+    ones with numbers or sources. URLs of dropped points are kept in a
+    trailing "Sources:" line. Returns (compacted_text, fits), where fits is
+    False when headings and sources alone exceed the budget and an LLM
+    summary is needed instead.
+    """
+    if estimate_tokens(text) <= budget:
+        return text, True
+
+    query_words = _words(query)
+    candidates = []
+    seen = []
+    for position, unit in enumerate(_units(text)):
+        words = _words(unit)
+        numbers = set(_NUMBER_RE.findall(_URL_RE.sub(" ", unit)))
+        urls = _URL_RE.findall(unit)
+        # Near-duplicate of an earlier point (same wording, same figures)
+        duplicate = any(
+            words and numbers == other_numbers and len(words & other) / len(words | other) > 0.8
+            for other, other_numbers in seen
+        )
+        if duplicate:
+            candidates.append((position, unit, urls, None))
+            continue
+        seen.append((words, numbers))
+        if _is_heading(unit):
+            score = float("inf")
+        else:
+            score = len(words & query_words) + (1 if numbers else 0) + (1 if urls else 0) + min(len(words), 20) / 20
+        candidates.append((position, unit, urls, score))
+
+    selected = []
+    kept_urls = set()
+    used = 0
+    ranked = sorted((c for c in candidates if c[3] is not None), key=lambda c: (-c[3], c[0]))
+    for position, unit, urls, score in ranked:
+        cost = estimate_tokens(unit) + 1
+        if score != float("inf") and used + cost > budget:
+            continue
+        selected.append((position, unit))
+        kept_urls.update(urls)
+        used += cost
+
+    dropped_urls = []
+    for _, _, urls, _ in candidates:
+        for url in urls:
+            if url not in kept_urls and url not in dropped_urls:
+                dropped_urls.append(url)
+
+    lines = [unit for _, unit in sorted(selected)]
+    if dropped_urls:
+        sources = "Sources: " + " ".join(dropped_urls)
+        # Make room for the sources line by dropping the weakest kept points
+        by_score = {position: score for position, _, _, score in candidates}
+        while used + estimate_tokens(sources) > budget and selected:
+            weakest = min(selected, key=lambda item: (by_score[item[0]], -item[0]))
+            if by_score[weakest[0]] == float("inf"):
+                break
+            selected.remove(weakest)
+            used -= estimate_tokens(weakest[1]) + 1
+        lines = [unit for _, unit in sorted(selected)] + [sources]
+        used += estimate_tokens(sources)
+
+    return "\n".join(lines), used <= budget
+
+
+def compaction_stats(original, compacted, method):
+    original_tokens = estimate_tokens(original)
+    compacted_tokens = estimate_tokens(compacted)
+    return {
+        "method": method,
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "saved_tokens": original_tokens - compacted_tokens,
+    }
@@ -0,0 +1,101 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class InFlightLimitExceeded(Exception):
+    """Raised when a request cannot get an in-flight slot in time"""
+
+
+class InFlightLimiter:
+    """Caps the number of concurrently running requests.
+
+    Up to ``max_in_flight`` requests run at once. Further requests wait in a
+    queue of at most ``max_queue`` entries for up to ``queue_timeout`` seconds;
+    anything beyond that is rejected with InFlightLimitExceeded so callers can
+    answer 429 instead of piling up behind a starved worker pool.
+    """
+
+    def __init__(self, max_in_flight, max_queue=0, queue_timeout=0.0):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold an in-flight slot for the duration of the block"""
+        if self._semaphore.locked():
+            if self.waiting >= self.max_queue or self.queue_timeout <= 0:
+                self.rejected += 1
+                raise InFlightLimitExceeded("Too many requests in flight")
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise InFlightLimitExceeded("Timed out waiting for an in-flight slot")
+            finally:
+                self.waiting -= 1
+        else:
+            await self._semaphore.acquire()
+
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+        }
+
+
+class SingleFlight:
+    """Collapses identical concurrent calls into one execution.
+
+    The first caller for a key starts the work; callers arriving while it is
+    running await the same result, and an exception reaches all of them. The
+    work runs as a separate task and is only cancelled once every caller
+    waiting on it has been cancelled.
+    """
+
+    def __init__(self):
+        self._calls = {}  # key -> [task, waiter_count]
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key, coro_func):
+        call = self._calls.get(key)
+        if call is None:
+            self.executions += 1
+            task = asyncio.ensure_future(coro_func())
+            call = [task, 0]
+            self._calls[key] = call
+            task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.coalesced += 1
+
+        task = call[0]
+        call[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            call[1] -= 1
+            if call[1] == 0 and not task.done():
+                task.cancel()
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self):
+        return {"executions": self.executions, "coalesced": self.coalesced, "in_flight": len(self._calls)}
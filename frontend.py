@@ -1,3 +1,4 @@
+import json
 import streamlit as st
 import requests
 
@@ -96,6 +97,32 @@ with col2:
     response_container = st.container()
 
 API_URL = "http://127.0.0.1:9999/chat"
+STREAM_API_URL = "http://127.0.0.1:9999/chat/stream"
+# The stream emits an event at every phase transition, so the read timeout bounds a single phase
+PHASE_TIMEOUT = 180
+
+
+def stream_events(response):
+    """Parse the server-sent events of a /chat/stream response"""
+    for line in response.iter_lines(decode_unicode=True):
+        if line and line.startswith("data: "):
+            yield json.loads(line[len("data: "):])
+
+
+def stream_tokens(events, final, progress):
+    """Yield token text for st.write_stream, showing phase events in progress
+    and keeping the terminal event in final"""
+    for event in events:
+        if event.get("type") == "phase":
+            if event.get("status") == "in_progress":
+                progress.info(event.get("message"))
+            else:
+                progress.success(event.get("message"))
+        elif event.get("type") == "token":
+            yield event.get("text", "")
+        elif event.get("type") in ("result", "error"):
+            final.update(event)
+            return
 
 if st.button("🚀 Ask Agent!", type="primary", use_container_width=True):
     if user_query.strip():
@@ -114,11 +141,28 @@ if st.button("🚀 Ask Agent!", type="primary", use_container_width=True):
                 "agent_mode": backend_mode
             }
             
-            response = requests.post(API_URL, json=payload)
+            response = requests.post(STREAM_API_URL, json=payload, stream=True, timeout=(10, PHASE_TIMEOUT))
             
-            if response.status_code == 200:
-                response_data = response.json()
+            if response.status_code == 200 and response.headers.get("content-type", "").startswith("text/event-stream"):
+                # Show phases and tokens as they arrive, then swap in the full structured response
+                final = {}
+                live_output = response_container.empty()
+                with live_output.container():
+                    progress = st.container()
+                    try:
+                        st.write_stream(stream_tokens(stream_events(response), final, progress))
+                    except requests.exceptions.ConnectionError:
+                        final = {"type": "error", "error": f"No progress from the agents for {PHASE_TIMEOUT}s, the current phase timed out."}
+                live_output.empty()
                 
+                if final.get("type") == "result":
+                    response_data = final["data"]
+                else:
+                    response_data = {"error": final.get("error", "Stream ended unexpectedly")}
+            elif response.status_code == 200:
+                response_data = response.json()
+            
+            if response.status_code == 200:
                 if "error" in response_data:
                     st.error(response_data["error"])
                 else:
@@ -179,37 +223,49 @@ if st.button("🚀 Ask Agent!", type="primary", use_container_width=True):
                         
                         # SEQUENTIAL MULTI-AGENT OUTPUT
                         elif agent_mode == "Multi-Agent (Sequential)":
+                            metadata = response_data.get("metadata", {})
+                            route = metadata.get("route")
                             st.success("✅ Multi-Agent Processing Complete!")
                             
+                            # Simple queries are routed past the full pipeline; say which path answered
+                            if route:
+                                st.info(f"🧭 Route: **{route}** - {metadata.get('route_reason', '')}")
+                            
                             # Show workflow steps
-                            with st.expander("🔄 Agent Workflow", expanded=False):
-                                for step in response_data.get("steps", []):
-                                    if step.get("status") == "in_progress":
-                                        st.info(step.get("message"))
-                                    else:
-                                        st.success(step.get("message"))
+                            if response_data.get("steps"):
+                                with st.expander("🔄 Agent Workflow", expanded=False):
+                                    for step in response_data.get("steps", []):
+                                        if step.get("status") == "in_progress":
+                                            st.info(step.get("message"))
+                                        else:
+                                            st.success(step.get("message"))
                             
                             st.divider()
                             
-                            # Tabs for each agent output
-                            tab1, tab2 = st.tabs(["✍️ Final Response", "🧠 Analysis"])
-                            
-                            with tab1:
-                                st.markdown("### Writer Agent Output")
+                            if route in ("fast", "single"):
+                                # One model call, no research or analysis agents
+                                st.markdown(f"### Direct Answer ({metadata.get('model', selected_model)})")
                                 st.markdown(response_data.get("final_response", "No response"))
+                            else:
+                                # Tabs for each agent output
+                                tab1, tab2 = st.tabs(["✍️ Final Response", "🧠 Analysis"])
+                                
+                                with tab1:
+                                    st.markdown("### Writer Agent Output")
+                                    st.markdown(response_data.get("final_response", "No response"))
 
-                            with tab2:
-                                st.markdown("### Analyzer Agent Output")
-                                st.markdown(response_data.get("analysis", "No analysis"))
+                                with tab2:
+                                    st.markdown("### Analyzer Agent Output")
+                                    st.markdown(response_data.get("analysis", "No analysis"))
                             
                             
                             # Show metadata
                             st.divider()
                             col_a, col_b = st.columns(2)
                             with col_a:
-                                st.metric("Agents Used", response_data.get("metadata", {}).get("total_agents", 3))
+                                st.metric("Agents Used", metadata.get("total_agents", 3))
                             with col_b:
-                                search_status = "✅ Enabled" if response_data.get("metadata", {}).get("search_enabled") else "❌ Disabled"
+                                search_status = "✅ Enabled" if metadata.get("search_enabled") else "❌ Disabled"
                                 st.metric("Web Search", search_status)
                         
                         # SINGLE AGENT OUTPUT
@@ -0,0 +1,249 @@
+"""Declarative DAG pipelines for MultiAgentOrchestrator.
+
+A Graph is a set of Nodes; each node names the nodes whose outputs it takes
+as inputs. run_graph starts every node as soon as its inputs are ready, so
+independent nodes run concurrently, and passes each output along to the
+nodes that depend on it. A node may have a timeout; on timeout its fallback
+output is used, or the run fails if it has none.
+
+Nodes are either agent nodes, declared with a system prompt and a query
+template filled from the user's query and the node's inputs, or function
+nodes wrapping an async callable. Graphs are looked up by the request's
+agent_mode: register_graph adds one from Python, and AGENT_GRAPHS points to a
+JSON file of agent-node graphs loaded at startup.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+
+from llm_registry import registry
+
+# Default per-node timeout in seconds; 0 means none
+GRAPH_NODE_TIMEOUT = float(os.environ.get("GRAPH_NODE_TIMEOUT", "0"))
+AGENT_GRAPHS = os.environ.get("AGENT_GRAPHS", "")
+
+_graphs = {}  # agent_mode -> Graph, or a callable building one for an orchestrator
+
+
+class NodeTimeout(Exception):
+    """Raised when a node without a fallback runs past its timeout"""
+
+
+class Node:
+    """One step of a graph.
+
+    Agent nodes take prompt (the system prompt) and template, formatted with
+    {query} and one field per input; tools=True gives them the web search
+    tool when search is enabled. Function nodes take run, an async callable
+    (orchestrator, query, inputs) -> output. start_message and done_message,
+    when set, are recorded as phase steps around the node.
+
+    An eager function node starts as soon as any of its inputs is ready and
+    gets asyncio futures instead of values, so it can work on inputs as they
+    arrive. Eager nodes mostly wait, so they do not count against the graph's
+    concurrency cap, and their timeout only starts once every input is ready.
+    """
+
+    def __init__(self, name, run=None, inputs=(), prompt=None, template="{query}", tools=False, search_results=1,
+                 phase=None, agent=None, stream=False, timeout=None, fallback=None, start_message=None,
+                 done_message=None, eager=False):
+        if run is None and prompt is None:
+            raise ValueError(f"Node {name} needs either run or prompt")
+        if eager and run is None:
+            raise ValueError(f"Eager node {name} needs run")
+        self.name = name
+        self.run = run
+        self.inputs = tuple(inputs)
+        self.prompt = prompt
+        self.template = template
+        self.tools = tools
+        self.search_results = search_results
+        self.phase = phase or name
+        self.agent = agent
+        self.stream = stream
+        self.timeout = GRAPH_NODE_TIMEOUT if timeout is None else timeout
+        self.fallback = fallback
+        self.start_message = start_message
+        self.done_message = done_message
+        self.eager = eager
+
+    async def execute(self, orchestrator, query, inputs):
+        if self.run is not None:
+            return await self.run(orchestrator, query, inputs)
+        tools = [registry.get_search_tool(max_results=self.search_results)] if self.tools and orchestrator.allow_search else []
+        return await orchestrator._run_agent(self.prompt, tools, self.template.format(query=query, **inputs),
+                                             self.fallback or "No response", self.phase, agent_name=self.agent or self.name,
+                                             stream=self.stream)
+
+
+class Graph:
+    """A validated DAG of nodes; output names the node holding the final response.
+
+    finish(orchestrator, query, outputs, steps, graph) builds the response dict; the
+    default returns the output node's text plus every node's text output.
+    concurrency caps how many nodes run at once.
+    """
+
+    def __init__(self, name, nodes, output, finish=None, concurrency=None):
+        self.name = name
+        self.nodes = list(nodes)
+        self.output = output
+        self.finish = finish or default_finish
+        self.concurrency = concurrency
+        self._validate()
+
+    def _validate(self):
+        names = [node.name for node in self.nodes]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Graph {self.name} has duplicate node names")
+        if self.output not in names:
+            raise ValueError(f"Graph {self.name} output node {self.output} does not exist")
+        for node in self.nodes:
+            missing = [name for name in node.inputs if name not in names]
+            if missing:
+                raise ValueError(f"Node {node.name} of graph {self.name} has unknown inputs: {', '.join(missing)}")
+        # Kahn's algorithm: every node must become ready eventually
+        ready, remaining = set(), {node.name: set(node.inputs) for node in self.nodes}
+        while remaining:
+            batch = [name for name, inputs in remaining.items() if inputs <= ready]
+            if not batch:
+                raise ValueError(f"Graph {self.name} has a cycle through: {', '.join(sorted(remaining))}")
+            ready.update(batch)
+            for name in batch:
+                del remaining[name]
+
+
+def default_finish(orchestrator, query, outputs, steps, graph):
+    return {
+        "final_response": outputs[graph.output],
+        "node_outputs": {name: output for name, output in outputs.items() if isinstance(output, str)},
+        "steps": steps,
+        "metadata": {
+            "mode": graph.name,
+            "nodes": len(graph.nodes),
+            "search_enabled": orchestrator.allow_search,
+        },
+    }
+
+
+async def _execute_eager(node, orchestrator, query, inputs):
+    """Run an eager node with its timeout counted from when its last input arrives, not from its start"""
+    work = asyncio.create_task(node.execute(orchestrator, query, inputs))
+    try:
+        while not work.done():
+            waiting = [future for future in inputs.values() if not future.done()]
+            if not waiting:
+                break
+            await asyncio.wait({work, *waiting}, return_when=asyncio.FIRST_COMPLETED)
+        return await asyncio.wait_for(work, node.timeout)
+    finally:
+        work.cancel()
+
+
+async def _run_node(node, orchestrator, query, inputs, steps, semaphore, timeouts):
+    async with contextlib.nullcontext() if node.eager else semaphore:
+        started_at = time.time()
+        step = {"phase": node.phase}
+        if node.agent:
+            step["agent"] = node.agent
+        if node.start_message:
+            extra = {"started_at": started_at} if node.agent else {}
+            await orchestrator._record_step(steps, {**step, "status": "in_progress", "message": node.start_message,
+                                                    **extra})
+        try:
+            if node.timeout and node.eager:
+                output = await _execute_eager(node, orchestrator, query, inputs)
+            elif node.timeout:
+                output = await asyncio.wait_for(node.execute(orchestrator, query, inputs), node.timeout)
+            else:
+                output = await node.execute(orchestrator, query, inputs)
+        except asyncio.TimeoutError:
+            if node.fallback is None:
+                raise NodeTimeout(f"Node {node.name} timed out after {node.timeout}s")
+            timeouts.append({"node": node.name, "timeout": node.timeout})
+            output = node.fallback
+        if node.done_message:
+            extra = {"started_at": started_at, "finished_at": time.time()} if node.agent else {}
+            await orchestrator._record_step(steps, {**step, "status": "completed", "message": node.done_message,
+                                                    **extra}, output=output if isinstance(output, str) else None)
+        return output
+
+
+async def run_graph(graph, orchestrator, query):
+    """Run every node once its inputs are ready; returns (outputs, steps, timeouts)"""
+    outputs, steps, timeouts = {}, [], []
+    pending = {node.name: node for node in graph.nodes}
+    running = {}
+    semaphore = asyncio.Semaphore(graph.concurrency or len(graph.nodes))
+    loop = asyncio.get_running_loop()
+    futures = {node.name: loop.create_future() for node in graph.nodes}  # handed to eager nodes
+    try:
+        while pending or running:
+            for name, node in list(pending.items()):
+                ready = [input_name in outputs for input_name in node.inputs]
+                if node.eager and (any(ready) or not ready):
+                    inputs = {input_name: futures[input_name] for input_name in node.inputs}
+                elif all(ready):
+                    inputs = {input_name: outputs[input_name] for input_name in node.inputs}
+                else:
+                    continue
+                del pending[name]
+                task = asyncio.create_task(_run_node(node, orchestrator, query, inputs, steps, semaphore, timeouts))
+                running[task] = node
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                name = running.pop(task).name
+                outputs[name] = task.result()
+                futures[name].set_result(outputs[name])
+    finally:
+        for task in running:
+            task.cancel()
+        for future in futures.values():
+            future.cancel()
+    return outputs, steps, timeouts
+
+
+def register_graph(name, graph):
+    """Make a Graph, or a callable (orchestrator) -> Graph, available as agent_mode=name"""
+    _graphs[name] = graph
+
+
+def get_graph(name, orchestrator):
+    """The Graph for agent_mode name, or None if there is no such mode"""
+    graph = _graphs.get(name)
+    if graph is None or isinstance(graph, Graph):
+        return graph
+    return graph(orchestrator)
+
+
+def graph_names():
+    return sorted(_graphs)
+
+
+def graph_from_spec(spec):
+    """Build an agent-node Graph from a dict such as
+
+    {"name": "pros_cons", "output": "judge", "nodes": [
+        {"name": "pros", "prompt": "List the strongest arguments for.", "tools": true},
+        {"name": "cons", "prompt": "List the strongest arguments against.", "tools": true},
+        {"name": "judge", "prompt": "Weigh both sides.", "inputs": ["pros", "cons"],
+         "template": "Question: {query}\\n\\nFor:\\n{pros}\\n\\nAgainst:\\n{cons}", "stream": true}]}
+    """
+    fields = ("inputs", "template", "tools", "search_results", "phase", "stream", "timeout", "fallback",
+              "start_message", "done_message")
+    nodes = [Node(node["name"], prompt=node["prompt"], **{
+        "start_message": f"🤖 **{node['name']}** is working...",
+        "done_message": f"✅ **{node['name']}** finished",
+        **{k: node[k] for k in fields if k in node},
+    }) for node in spec["nodes"]]
+    return Graph(spec["name"], nodes, spec["output"], concurrency=spec.get("concurrency"))
+
+
+def load_graphs(path):
+    """Register every graph in a JSON file holding one spec or a list of specs"""
+    with open(path, encoding="utf-8") as f:
+        specs = json.load(f)
+    for spec in specs if isinstance(specs, list) else [specs]:
+        register_graph(spec["name"], graph_from_spec(spec))
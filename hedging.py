@@ -0,0 +1,196 @@
+"""Hedged requests and provider failover for agent calls.
+
+A call that has not returned within the p95 latency observed for its
+(provider, model, phase) gets a backup call to the configured fallback model;
+whichever finishes first wins and the other is cancelled. A call that fails
+is retried once on the fallback. Hedges draw from a global budget that earns
+HEDGE_BUDGET hedges per primary call, so they cannot multiply provider spend
+when everything is slow at once. Failovers replace a failed call and are not
+charged to the budget.
+
+Streaming calls are never hedged (two streams would interleave tokens); they
+fail over only if nothing has been streamed yet.
+"""
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+
+from metrics import metrics, record_provider_error
+
+HEDGING = os.environ.get("HEDGING", "on") == "on"
+# Hedges allowed per primary call, and how many can be spent in a burst
+HEDGE_BUDGET = float(os.environ.get("HEDGE_BUDGET", "0.1"))
+HEDGE_BUDGET_BURST = float(os.environ.get("HEDGE_BUDGET_BURST", "5"))
+# Until a phase has HEDGE_MIN_SAMPLES latencies, hedge after HEDGE_DEFAULT_DELAY seconds
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("HEDGE_DEFAULT_DELAY", "15"))
+HEDGE_MIN_DELAY = float(os.environ.get("HEDGE_MIN_DELAY", "1"))
+HEDGE_WINDOW = int(os.environ.get("HEDGE_WINDOW", "200"))
+# "key=provider:model" pairs; key is a model name or a provider name
+HEDGE_FALLBACKS = os.environ.get(
+    "HEDGE_FALLBACKS", "Groq=Gemini:gemini-2.0-flash,Gemini=Groq:llama-3.3-70b-versatile")
+
+hedged_calls = metrics.counter(
+    "provider_hedged_calls_total", "Backup calls fired after a slow primary call, by winner",
+    ("model_name", "model_provider", "phase", "winner"))
+provider_failovers = metrics.counter(
+    "provider_failovers_total", "Calls retried on the fallback model after an error",
+    ("model_name", "model_provider", "phase"))
+
+
+def parse_fallbacks(spec):
+    fallbacks = {}
+    for pair in spec.split(","):
+        key, _, target = pair.partition("=")
+        provider, _, model = target.partition(":")
+        if key.strip() and provider.strip() and model.strip():
+            fallbacks[key.strip()] = (provider.strip(), model.strip())
+    return fallbacks
+
+
+class HedgePolicy:
+    def __init__(self, enabled=HEDGING, fallbacks=None, budget=HEDGE_BUDGET, burst=HEDGE_BUDGET_BURST,
+                 min_samples=HEDGE_MIN_SAMPLES, default_delay=HEDGE_DEFAULT_DELAY, min_delay=HEDGE_MIN_DELAY,
+                 window=HEDGE_WINDOW):
+        self.enabled = enabled
+        self.fallbacks = parse_fallbacks(HEDGE_FALLBACKS) if fallbacks is None else dict(fallbacks)
+        self.budget = budget
+        self.burst = burst
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self.min_delay = min_delay
+        self.window = window
+        self._latencies = {}  # (provider, model, phase) -> recent successful call durations
+        self._tokens = burst
+        self._lock = threading.Lock()
+        self.stats_counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "budget_denied": 0, "failovers": 0}
+
+    def fallback_for(self, provider, model):
+        fallback = self.fallbacks.get(model) or self.fallbacks.get(provider)
+        return None if fallback is None or fallback == (provider, model) else fallback
+
+    def observe(self, provider, model, phase, seconds):
+        with self._lock:
+            samples = self._latencies.setdefault((provider, model, phase), deque(maxlen=self.window))
+            samples.append(seconds)
+
+    def delay(self, provider, model, phase):
+        """Seconds to wait before hedging: the observed p95 for this phase"""
+        with self._lock:
+            samples = sorted(self._latencies.get((provider, model, phase), ()))
+        if len(samples) < self.min_samples:
+            return self.default_delay
+        return max(self.min_delay, samples[min(len(samples) - 1, int(0.95 * len(samples)))])
+
+    def _earn(self):
+        with self._lock:
+            self.stats_counts["calls"] += 1
+            self._tokens = min(self.burst, self._tokens + self.budget)
+
+    def _spend(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.stats_counts["hedges"] += 1
+                return True
+            self.stats_counts["budget_denied"] += 1
+            return False
+
+    async def run(self, phase, provider, model, make_call, hedge=True, can_failover=None):
+        """Await make_call(provider, model) with hedging and failover.
+
+        Returns (result, event). event is None for a plain call, otherwise a
+        dict describing the hedge or failover, including the provider and
+        model that produced the result.
+        """
+        fallback = self.fallback_for(provider, model) if self.enabled else None
+        self._earn()
+        started = time.perf_counter()
+        if fallback is None:
+            result = await make_call(provider, model)
+            self.observe(provider, model, phase, time.perf_counter() - started)
+            return result, None
+
+        primary = asyncio.create_task(make_call(provider, model))
+        backup = None
+        try:
+            delay = self.delay(provider, model, phase) if hedge else None
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done and self._spend():
+                backup = asyncio.create_task(make_call(*fallback))
+                winner = await self._first_success(primary, backup)
+                outcome = "fallback" if winner is backup else "primary"
+                hedged_calls.inc(model_name=model, model_provider=provider, phase=phase, winner=outcome)
+                if winner is backup:
+                    with self._lock:
+                        self.stats_counts["hedge_wins"] += 1
+                else:
+                    self.observe(provider, model, phase, time.perf_counter() - started)
+                used = fallback if winner is backup else (provider, model)
+                return winner.result(), {"phase": phase, "event": "hedge", "delay": round(delay, 3),
+                                         "winner": outcome, "provider": used[0], "model": used[1]}
+            try:
+                result = await primary
+            except Exception as e:
+                if can_failover is not None and not can_failover():
+                    raise
+                return await self._failover(phase, provider, model, fallback, make_call, e)
+            self.observe(provider, model, phase, time.perf_counter() - started)
+            return result, None
+        finally:
+            for task in (primary, backup):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _first_success(self, primary, backup):
+        """The first task to succeed; if both fail, the primary's error is raised"""
+        pending = {primary, backup}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if not task.cancelled() and task.exception() is None:
+                    return task
+        # Both failed: surface the primary's error
+        raise primary.exception()
+
+    async def _failover(self, phase, provider, model, fallback, make_call, error):
+        kind = record_provider_error(error, model, provider)
+        provider_failovers.inc(model_name=model, model_provider=provider, phase=phase)
+        with self._lock:
+            self.stats_counts["failovers"] += 1
+        started = time.perf_counter()
+        try:
+            result = await make_call(*fallback)
+        except Exception:
+            raise error
+        self.observe(*fallback, phase, time.perf_counter() - started)
+        return result, {"phase": phase, "event": "failover", "error": kind, "provider": fallback[0],
+                        "model": fallback[1]}
+
+    def run_sync(self, phase, provider, model, make_call):
+        """Blocking counterpart of run: failover only, since there is no loop to hedge on"""
+        fallback = self.fallback_for(provider, model) if self.enabled else None
+        try:
+            return make_call(provider, model), None
+        except Exception as e:
+            if fallback is None:
+                raise
+            kind = record_provider_error(e, model, provider)
+            provider_failovers.inc(model_name=model, model_provider=provider, phase=phase)
+            with self._lock:
+                self.stats_counts["failovers"] += 1
+            try:
+                result = make_call(*fallback)
+            except Exception:
+                raise e
+            return result, {"phase": phase, "event": "failover", "error": kind, "provider": fallback[0],
+                            "model": fallback[1]}
+
+    def stats(self):
+        with self._lock:
+            return {**self.stats_counts, "budget_tokens": round(self._tokens, 2)}
+
+
+hedge_policy = HedgePolicy()
@@ -0,0 +1,112 @@
+import json
+import logging
+import threading
+import time
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages.ai import AIMessage
+
+logger = logging.getLogger("ai_agent.usage")
+
+# cached_input_tokens counts prompt tokens the provider served from its prefix cache
+TOKEN_FIELDS = ("input_tokens", "output_tokens", "total_tokens", "cached_input_tokens")
+
+
+class ToolTimingHandler(BaseCallbackHandler):
+    """Callback handler that measures how long each tool call takes"""
+
+    def __init__(self):
+        self._started = {}
+        self._lock = threading.Lock()
+        self.tool_calls = []  # (tool_name, seconds)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs):
+        with self._lock:
+            self._started[run_id] = ((serialized or {}).get("name", "tool"), time.perf_counter())
+
+    def _finish(self, run_id):
+        with self._lock:
+            name, started = self._started.pop(run_id, ("tool", None))
+            if started is not None:
+                self.tool_calls.append((name, time.perf_counter() - started))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id)
+
+
+def message_usage(messages):
+    """LLM-call count, tool-call count and token usage from an agent's messages"""
+    stats = {"llm_calls": 0, "tool_calls": 0, **{field: 0 for field in TOKEN_FIELDS}}
+    for message in messages or []:
+        # Assistant turns replayed from conversation history carry no provider metadata
+        if not isinstance(message, AIMessage) or (message.usage_metadata is None and not message.response_metadata):
+            continue
+        stats["llm_calls"] += 1
+        stats["tool_calls"] += len(message.tool_calls or [])
+        usage = message.usage_metadata or {}
+        for field in TOKEN_FIELDS:
+            stats[field] += usage.get(field, 0) or 0
+        stats["cached_input_tokens"] += (usage.get("input_token_details") or {}).get("cache_read", 0) or 0
+    return stats
+
+
+class UsageTracker:
+    """Collects per-agent wall time, call counts and token usage for one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.records = []
+        self.annotations = {}
+        self._lock = threading.Lock()
+
+    def record(self, phase, agent, started, finished, messages=None, tool_timings=(), **extra):
+        """Record one agent invocation (or a bare tool call when messages is None)"""
+        record = {
+            "phase": phase,
+            "agent": agent,
+            "started": round(started - self.started, 4),
+            "wall_time": round(finished - started, 4),
+            **message_usage(messages),
+            "tool_time": round(sum(seconds for _, seconds in tool_timings), 4),
+            **extra,
+        }
+        if messages is None:
+            record["tool_calls"] = len(tool_timings)
+        with self._lock:
+            self.records.append(record)
+        logger.info(json.dumps({"event": "agent_invocation", **record}))
+        return record
+
+    def annotate(self, **fields):
+        """Attach extra top-level blocks (e.g. memory stats) to the summary"""
+        with self._lock:
+            self.annotations.update(fields)
+
+    def summary(self):
+        """The timings/usage blocks added to a response"""
+        with self._lock:
+            records = list(self.records)
+
+        phases = {}
+        by_phase = {}
+        for r in records:
+            start, end = r["started"], r["started"] + r["wall_time"]
+            span = phases.get(r["phase"])
+            phases[r["phase"]] = (min(span[0], start), max(span[1], end)) if span else (start, end)
+            totals = by_phase.setdefault(r["phase"], {"llm_calls": 0, "tool_calls": 0, **{f: 0 for f in TOKEN_FIELDS}})
+            for field in totals:
+                totals[field] += r[field]
+
+        usage = {field: sum(p[field] for p in by_phase.values()) for field in ("llm_calls", "tool_calls", *TOKEN_FIELDS)}
+        return {
+            "timings": {
+                "total": round(time.perf_counter() - self.started, 4),
+                "phases": {phase: round(end - start, 4) for phase, (start, end) in phases.items()},
+                "agents": records,
+            },
+            "usage": {**usage, "by_phase": by_phase},
+            **self.annotations,
+        }
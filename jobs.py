@@ -0,0 +1,342 @@
+"""Asynchronous jobs for long-running chat requests.
+
+POST /jobs queues a request and returns at once; workers run it in the
+background and GET /jobs/{id} reports its status, completed phases and
+result. Job state is kept in SQLite, so finished results outlive a restart.
+
+Several API processes may share one store. Each unfinished job is owned by
+the process that queued or took it, under a lease the owner renews every
+JOB_LEASE / 3 seconds. A process only takes over jobs whose lease has
+expired, so jobs left behind by a stopped process are queued again while
+those of a live process are left alone. Workers claim a job with a
+conditional update, so it never runs twice even if two processes have it
+queued.
+
+Workers take jobs by priority class. JOB_INTERACTIVE_WORKERS of them only
+ever take interactive jobs, so a short single-agent request never waits
+behind a pool full of batch debates.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_INTERACTIVE_WORKERS = int(os.environ.get("JOB_INTERACTIVE_WORKERS", "1"))
+JOB_MAX_QUEUED = int(os.environ.get("JOB_MAX_QUEUED", "1000"))
+JOB_STORE_PATH = os.environ.get("JOB_STORE_PATH", "jobs.sqlite3")
+JOB_TTL = float(os.environ.get("JOB_TTL", str(24 * 3600)))
+# Longest long-poll wait, kept below typical load-balancer idle timeouts
+JOB_MAX_WAIT = float(os.environ.get("JOB_MAX_WAIT", "50"))
+# Seconds a process holds its jobs without renewing before another process may take them over
+JOB_LEASE = float(os.environ.get("JOB_LEASE", "30"))
+
+# Highest priority first
+PRIORITIES = ("interactive", "default", "batch")
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+
+class JobQueueFull(Exception):
+    """Raised when too many jobs are already waiting"""
+
+
+class JobStore:
+    """SQLite-backed job records"""
+
+    def __init__(self, path=JOB_STORE_PATH, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, status TEXT, priority TEXT, created_at REAL, started_at REAL, finished_at REAL, "
+            "request TEXT, phases TEXT, result TEXT, error TEXT, owner TEXT, lease_until REAL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in columns:  # stores created before jobs had leases
+                self._conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)")
+        self._conn.commit()
+
+    def create(self, request, priority, owner=None, lease=JOB_LEASE):
+        job = {"id": uuid.uuid4().hex, "status": "queued", "priority": priority, "created_at": time.time(),
+               "started_at": None, "finished_at": None, "request": request, "phases": [], "result": None,
+               "error": None}
+        with self._lock:
+            self._conn.execute("DELETE FROM jobs WHERE finished_at <= ?", (time.time() - self.ttl,))
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, priority, created_at, request, phases, owner, lease_until) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job["id"], "queued", priority, job["created_at"], json.dumps(request), "[]", owner,
+                 job["created_at"] + lease),
+            )
+            self._conn.commit()
+        return job
+
+    def update(self, job_id, where=None, **fields):
+        """Set fields of a job; where maps columns to their required current value, a tuple meaning any of.
+
+        Returns whether the job was updated, so a guarded update doubles as a claim.
+        """
+        for name in ("request", "phases", "result"):
+            if name in fields:
+                fields[name] = json.dumps(fields[name], default=str)
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        conditions, params = ["id = ?"], [job_id]
+        for name, value in (where or {}).items():
+            values = value if isinstance(value, tuple) else (value,)
+            conditions.append(f"{name} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        with self._lock:
+            cursor = self._conn.execute(f"UPDATE jobs SET {assignments} WHERE {' AND '.join(conditions)}",
+                                        (*fields.values(), *params))
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def get(self, job_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, priority, created_at, started_at, finished_at, request, phases, result, error "
+                "FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(("id", "status", "priority", "created_at", "started_at", "finished_at", "request", "phases",
+                        "result", "error"), row))
+        for name in ("request", "phases", "result"):
+            job[name] = json.loads(job[name]) if job[name] is not None else None
+        return job
+
+    def renew(self, owner, lease=JOB_LEASE):
+        """Extend the lease on every unfinished job owned by owner"""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET lease_until = ? WHERE owner = ? AND status IN ('queued', 'running')",
+                               (time.time() + lease, owner))
+            self._conn.commit()
+
+    def take_over(self, owner, lease=JOB_LEASE):
+        """Queue every unfinished job whose lease expired again under owner; returns (id, priority) pairs, oldest first"""
+        now = time.time()
+        expired = "status IN ('queued', 'running') AND (lease_until IS NULL OR lease_until < ?)"
+        with self._lock:
+            rows = self._conn.execute(f"SELECT id, priority FROM jobs WHERE {expired} ORDER BY created_at",
+                                      (now,)).fetchall()
+            taken = [(job_id, priority) for job_id, priority in rows if self._conn.execute(
+                f"UPDATE jobs SET status = 'queued', started_at = NULL, owner = ?, lease_until = ? "
+                f"WHERE id = ? AND {expired}", (owner, now + lease, job_id, now)
+            ).rowcount == 1]
+            self._conn.commit()
+        return taken
+
+    def cancelled(self, job_ids):
+        """The ids among job_ids whose job was cancelled, possibly by another process"""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id FROM jobs WHERE status = 'cancelled' AND id IN ({', '.join('?' * len(job_ids))})", job_ids
+            ).fetchall()
+        return {row[0] for row in rows}
+
+
+class JobManager:
+    """Priority worker pool running jobs through run_job(request, emit) -> result"""
+
+    def __init__(self, run_job, store=None, workers=JOB_WORKERS, interactive_workers=JOB_INTERACTIVE_WORKERS,
+                 max_queued=JOB_MAX_QUEUED, lease=JOB_LEASE):
+        self.run_job = run_job
+        self._store = store
+        self.workers = max(1, workers)
+        self.interactive_workers = min(interactive_workers, self.workers - 1)
+        self.max_queued = max_queued
+        self.lease = lease
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # unique per manager, even within one process
+        self._queues = {priority: deque() for priority in PRIORITIES}
+        self._wakeup = None
+        self._tasks = []
+        self._running = {}  # job id -> task
+        self._live = {}  # job id -> {"phases": [...], "subscribers": [asyncio.Queue]}
+
+    @property
+    def store(self):
+        """Opened on first use so importing the API creates no database file"""
+        if self._store is None:
+            self._store = JobStore()
+        return self._store
+
+    def _start(self):
+        """Start the workers and the lease keeper on the running loop.
+
+        Called from every job endpoint, so jobs left over by a stopped process resume as soon as the API is used.
+        """
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Condition()
+        self._tasks.append(asyncio.create_task(self._keep_leases()))
+        for i in range(self.workers):
+            classes = PRIORITIES[:1] if i < self.interactive_workers else PRIORITIES
+            self._tasks.append(asyncio.create_task(self._worker(classes)))
+
+    async def _keep_leases(self):
+        """Renew this manager's leases, take over expired jobs and stop jobs cancelled by another process"""
+        while True:
+            try:
+                self.store.renew(self.owner, self.lease)
+                taken = self.store.take_over(self.owner, self.lease)
+                cancelled = self.store.cancelled(self._running)
+            except sqlite3.OperationalError:
+                taken, cancelled = [], ()  # store busy with another process; retried next round, well within the lease
+            if taken:
+                async with self._wakeup:
+                    for job_id, priority in taken:
+                        self._queues[priority if priority in self._queues else "default"].append(job_id)
+                    self._wakeup.notify_all()
+            for job_id in cancelled:
+                if job_id in self._running:
+                    self._running[job_id].cancel()
+            await asyncio.sleep(self.lease / 3)
+
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def submit(self, request, priority):
+        self._start()
+        if self.queued() >= self.max_queued:
+            raise JobQueueFull("Too many queued jobs")
+        job = self.store.create(request, priority, self.owner, self.lease)
+        async with self._wakeup:
+            self._queues[priority].append(job["id"])
+            self._wakeup.notify_all()
+        return job
+
+    async def _next(self, classes):
+        async with self._wakeup:
+            while True:
+                for priority in classes:
+                    if self._queues[priority]:
+                        return self._queues[priority].popleft()
+                await self._wakeup.wait()
+
+    async def _worker(self, classes):
+        while True:
+            job_id = await self._next(classes)
+            task = asyncio.create_task(self._run(job_id))
+            self._running[job_id] = task
+            try:
+                # wait() returns when the job is cancelled but raises when the worker itself is
+                await asyncio.wait({task})
+            finally:
+                task.cancel()
+                self._running.pop(job_id, None)
+
+    async def _run(self, job_id):
+        # Claim the job: only one worker of one process gets it from queued to running
+        if not self.store.update(job_id, where={"status": "queued", "owner": self.owner}, status="running",
+                                 started_at=time.time()):
+            return
+        job = self.store.get(job_id)
+        live = self._live.setdefault(job_id, {"phases": [], "subscribers": []})
+        # Writes only land while this manager still holds the job
+        held = {"status": "running", "owner": self.owner}
+
+        async def emit(event):
+            if event.get("type") == "phase":
+                live["phases"].append({k: v for k, v in event.items() if k not in ("type", "output")})
+                self.store.update(job_id, where=held, phases=live["phases"])
+            self._publish(job_id, event)
+
+        try:
+            result = await self.run_job(job["request"], emit)
+            status, error = ("failed", result["error"]) if "error" in result else ("succeeded", None)
+            self.store.update(job_id, where=held, status=status, finished_at=time.time(), result=result, error=error)
+            self._publish(job_id, {"type": "result", "data": result})
+        except asyncio.CancelledError:
+            self.store.update(job_id, where=held, status="cancelled", finished_at=time.time())
+            self._publish(job_id, {"type": "error", "error": "Job cancelled"})
+            raise
+        except Exception as e:
+            self.store.update(job_id, where=held, status="failed", finished_at=time.time(), error=str(e))
+            self._publish(job_id, {"type": "error", "error": str(e)})
+        finally:
+            self._publish(job_id, None)
+            self._live.pop(job_id, None)
+
+    def _publish(self, job_id, event):
+        for queue in self._live.get(job_id, {}).get("subscribers", []):
+            queue.put_nowait(event)
+
+    def get(self, job_id):
+        self._start()
+        job = self.store.get(job_id)
+        if job is not None and job["status"] == "queued":
+            queue = self._queues.get(job["priority"], ())
+            job["queue_position"] = list(queue).index(job_id) + 1 if job_id in queue else None
+        return job
+
+    async def wait(self, job_id, timeout):
+        """Long-poll: return the job once finished or after timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job["status"] in FINISHED or time.monotonic() >= deadline:
+                return job
+            async for _ in self.events(job_id, timeout=deadline - time.monotonic()):
+                pass
+
+    async def events(self, job_id, timeout=None):
+        """Yield live phase/token events of a queued or running job until it finishes"""
+        if job_id not in self._live:
+            job = self.store.get(job_id)
+            if job is None or job["status"] in FINISHED:
+                return
+            self._live[job_id] = {"phases": [], "subscribers": []}
+        deadline = None if timeout is None else time.monotonic() + timeout
+        queue = asyncio.Queue()
+        subscribers = self._live[job_id]["subscribers"]
+        subscribers.append(queue)
+        try:
+            while True:
+                remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+                event = await asyncio.wait_for(queue.get(), remaining)
+                if event is None:
+                    return
+                yield event
+        except asyncio.TimeoutError:
+            return
+        finally:
+            subscribers.remove(queue)
+
+    def cancel(self, job_id):
+        """Cancel a queued or running job; returns False if it already finished.
+
+        A job held by another process is marked cancelled in the store, and that process stops it on its next
+        lease renewal.
+        """
+        self._start()
+        job = self.store.get(job_id)
+        if job is None or job["status"] in FINISHED:
+            return False
+        for queue in self._queues.values():
+            if job_id in queue:
+                queue.remove(job_id)
+                self.store.update(job_id, where={"status": "queued"}, status="cancelled", finished_at=time.time())
+                self._publish(job_id, None)
+                self._live.pop(job_id, None)
+                return True
+        task = self._running.get(job_id)
+        if task is not None:
+            task.cancel()
+            return True
+        return self.store.update(job_id, where={"status": ("queued", "running")}, status="cancelled",
+                                 finished_at=time.time())
+
+    def stats(self):
+        return {"workers": self.workers, "interactive_workers": self.interactive_workers, "running": len(self._running),
+                **{f"queued_{priority}": len(queue) for priority, queue in self._queues.items()}}
@@ -0,0 +1,149 @@
+import importlib
+import os
+import threading
+from collections import OrderedDict
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from search_cache import CachedSearchTool
+
+AGENT_CACHE_SIZE = int(os.environ.get("AGENT_CACHE_SIZE", "64"))
+
+# Provider SDKs are heavy to import, so each is only loaded on first use
+PROVIDER_MODULES = {
+    "Groq": "langchain_groq",
+    "Gemini": "langchain_google_genai",
+}
+SEARCH_MODULE = "langchain_tavily"
+AGENT_MODULE = "langchain.agents"
+
+
+def _create_groq(llm_id):
+    from langchain_groq import ChatGroq
+    return ChatGroq(model=llm_id)
+
+
+def _create_gemini(llm_id):
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    return ChatGoogleGenerativeAI(model=llm_id, google_api_key=os.environ.get("GEMINI_API_KEY"))
+
+
+def _create_tavily(max_results):
+    from langchain_tavily import TavilySearch
+    return TavilySearch(max_results=max_results)
+
+
+class LLMRegistry:
+    """Process-wide cache of LLM clients, search tools and compiled agent graphs.
+
+    One client is kept per (provider, model) so its HTTP connection pool stays
+    open between requests. Compiled agents are cached per
+    (provider, model, system prompt, tool set) with LRU eviction.
+    """
+
+    def __init__(self, max_agents=AGENT_CACHE_SIZE):
+        self.max_agents = max_agents
+        self._lock = threading.Lock()
+        self._llms = {}
+        self._tools = {}
+        self._agents = OrderedDict()
+        self._providers = {"Groq": _create_groq, "Gemini": _create_gemini}
+        self._search_factory = _create_tavily
+        self._stats = {
+            "llm_hits": 0, "llm_misses": 0,
+            "agent_hits": 0, "agent_misses": 0, "agent_evictions": 0,
+        }
+
+    def register_provider(self, provider, factory):
+        """Register factory(llm_id) -> chat model for a provider name (e.g. a local stand-in)"""
+        with self._lock:
+            self._providers[provider] = factory
+
+    def has_provider(self, provider):
+        with self._lock:
+            return provider in self._providers
+
+    def set_search_factory(self, factory):
+        """Replace the factory(max_results) -> search tool used behind the search cache"""
+        with self._lock:
+            self._search_factory = factory
+            self._tools.clear()
+            self._agents.clear()
+
+    def _create_llm(self, llm_id, provider):
+        """Build a new chat client for the provider"""
+        factory = self._providers.get(provider)
+        if factory is None:
+            raise ValueError(f"Unknown model provider: {provider}")
+        return factory(llm_id)
+
+    def get_llm(self, llm_id, provider):
+        """Return the shared chat client for (provider, model)"""
+        key = (provider, llm_id)
+        with self._lock:
+            llm = self._llms.get(key)
+            if llm is not None:
+                self._stats["llm_hits"] += 1
+                return llm
+            self._stats["llm_misses"] += 1
+            llm = self._create_llm(llm_id, provider)
+            self._llms[key] = llm
+            return llm
+
+    def get_search_tool(self, max_results):
+        """Return the shared, cached TavilySearch tool for a result count"""
+        with self._lock:
+            tool = self._tools.get(max_results)
+            if tool is None:
+                tool = CachedSearchTool(self._search_factory(max_results))
+                self._tools[max_results] = tool
+            return tool
+
+    def get_agent(self, llm_id, provider, system_prompt, tools=()):
+        """Return a compiled agent graph, building it on a cache miss"""
+        tool_key = tuple((type(t).__name__, t.name, getattr(t, "max_results", None)) for t in tools)
+        key = (provider, llm_id, system_prompt, tool_key)
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent is not None:
+                self._agents.move_to_end(key)
+                self._stats["agent_hits"] += 1
+                return agent
+            self._stats["agent_misses"] += 1
+
+        from langchain.agents import create_agent
+        llm = self.get_llm(llm_id, provider)
+        agent = create_agent(model=llm, tools=list(tools), system_prompt=system_prompt)
+
+        with self._lock:
+            self._agents[key] = agent
+            self._agents.move_to_end(key)
+            while len(self._agents) > self.max_agents:
+                self._agents.popitem(last=False)
+                self._stats["agent_evictions"] += 1
+        return agent
+
+    def preload(self, providers, search=True):
+        """Import the SDKs of the given providers (and the agent/search stacks) ahead of the first request"""
+        modules = [AGENT_MODULE] + ([SEARCH_MODULE] if search else [])
+        for provider in providers:
+            if provider not in PROVIDER_MODULES:
+                raise ValueError(f"Unknown model provider: {provider}")
+            modules.append(PROVIDER_MODULES[provider])
+        for module in modules:
+            importlib.import_module(module)
+        return modules
+
+    def stats(self):
+        """Hit/miss counters and current cache sizes"""
+        with self._lock:
+            return {
+                **self._stats,
+                "llms_cached": len(self._llms),
+                "agents_cached": len(self._agents),
+                "max_agents": self.max_agents,
+            }
+
+
+registry = LLMRegistry()
@@ -0,0 +1,160 @@
+"""Sliding-window plus rolling-summary memory for conversations.
+
+Once a conversation outgrows the model's history budget, the last
+MEMORY_KEEP_MESSAGES messages are sent verbatim and everything before them is
+replaced by a summary. Summaries are built in a background thread after a
+response, each one folding only the new messages into the previous summary,
+so no summarization runs on the request path; until one is ready the full
+history is sent.
+
+Summaries are keyed by a digest of the messages they cover, so the same
+conversation prefix maps to the same summary whether it arrives through a
+session or as a resent /chat message list.
+"""
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from compaction import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+MEMORY = os.environ.get("MEMORY", "on") == "on"
+MEMORY_KEEP_MESSAGES = int(os.environ.get("MEMORY_KEEP_MESSAGES", "6"))
+MEMORY_CACHE_SIZE = int(os.environ.get("MEMORY_CACHE_SIZE", "1000"))
+MEMORY_SUMMARY_WORKERS = int(os.environ.get("MEMORY_SUMMARY_WORKERS", "2"))
+
+# Token budget for the conversation history sent with each request
+DEFAULT_MEMORY_BUDGET = int(os.environ.get("MEMORY_BUDGET", "3000"))
+MODEL_MEMORY_BUDGETS = {
+    "groq/compound-mini": 1500,
+    "llama3-70b-8192": 2000,
+    "gemini-2.0-flash": 8000,
+    "gemini-2.5-pro": 8000,
+}
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an AI assistant.
+        1. Start from the existing summary, if any, and fold in the new messages
+        2. Keep the user's goals, preferences, decisions, facts, numbers and open questions
+        3. Drop greetings, repetition and filler
+
+        Format: Return ONLY the updated summary as short bullet points."""
+
+
+def memory_budget(llm_id):
+    return MODEL_MEMORY_BUDGETS.get(llm_id, DEFAULT_MEMORY_BUDGET)
+
+
+def _role_content(message):
+    """(role, content) of a plain-string user message or a role/content dict"""
+    if isinstance(message, str):
+        return "user", message
+    return message["role"], message["content"]
+
+
+def message_tokens(messages):
+    return sum(estimate_tokens(_role_content(m)[1]) for m in messages)
+
+
+def render_messages(messages):
+    return "\n\n".join(f"{role.capitalize()}: {content}" for role, content in map(_role_content, messages))
+
+
+def _prefix_digests(messages):
+    """Digest of every prefix: element i identifies messages[:i + 1]"""
+    h = hashlib.sha256()
+    digests = []
+    for message in messages:
+        role, content = _role_content(message)
+        h.update(f"{role}\0{content}\0".encode("utf-8"))
+        digests.append(h.copy().hexdigest())
+    return digests
+
+
+class ConversationMemory:
+    """Builds bounded agent context from a full message list and keeps summaries up to date"""
+
+    def __init__(self, keep_messages=MEMORY_KEEP_MESSAGES, max_summaries=MEMORY_CACHE_SIZE,
+                 workers=MEMORY_SUMMARY_WORKERS, enabled=MEMORY):
+        self.keep_messages = max(1, keep_messages)
+        self.max_summaries = max_summaries
+        self.enabled = enabled
+        self._summaries = OrderedDict()  # prefix digest -> (messages covered, summary)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="memory-summary")
+        self.updates = 0
+        self.failures = 0
+
+    def _latest_summary(self, digests):
+        """(covered, summary) for the longest prefix that has a summary, else (0, None)"""
+        with self._lock:
+            for i in range(len(digests) - 1, -1, -1):
+                entry = self._summaries.get(digests[i])
+                if entry is not None:
+                    self._summaries.move_to_end(digests[i])
+                    return entry
+        return 0, None
+
+    def prepare(self, messages, llm_id):
+        """Return (context_messages, stats) fitting the history into the model's budget"""
+        original = message_tokens(messages)
+        stats = {"method": "none", "budget_tokens": memory_budget(llm_id), "original_tokens": original,
+                 "context_tokens": original, "saved_tokens": 0}
+        if not self.enabled or original <= stats["budget_tokens"] or len(messages) <= self.keep_messages:
+            return messages, stats
+        covered, summary = self._latest_summary(_prefix_digests(messages[:len(messages) - self.keep_messages]))
+        if summary is None:
+            # The background summary has not caught up yet; send the full history this time
+            stats["method"] = "pending"
+            return messages, stats
+        context = [{"role": "user", "content": f"Summary of our earlier conversation:\n{summary}"},
+                   *messages[covered:]]
+        context_tokens = message_tokens(context)
+        stats.update(method="summary", summarized_messages=covered, context_tokens=context_tokens,
+                     saved_tokens=original - context_tokens)
+        return context, stats
+
+    def schedule_update(self, messages, llm_id, summarize):
+        """Fold older messages into the summary in the background once history exceeds the budget.
+
+        summarize(previous_summary, messages) returns the new summary text and
+        runs on a worker thread.
+        """
+        if not self.enabled or len(messages) <= self.keep_messages or message_tokens(messages) <= memory_budget(llm_id):
+            return
+        folded = list(messages[:len(messages) - self.keep_messages])
+        digests = _prefix_digests(folded)
+        with self._lock:
+            if digests[-1] in self._summaries or digests[-1] in self._pending:
+                return
+            self._pending.add(digests[-1])
+        self._executor.submit(self._update, folded, digests, summarize)
+
+    def _update(self, folded, digests, summarize):
+        try:
+            covered, summary = self._latest_summary(digests)
+            new_summary = summarize(summary, folded[covered:])
+            with self._lock:
+                self._summaries[digests[-1]] = (len(folded), new_summary)
+                self._summaries.move_to_end(digests[-1])
+                while len(self._summaries) > self.max_summaries:
+                    self._summaries.popitem(last=False)
+                self.updates += 1
+        except Exception:
+            self.failures += 1
+            logger.exception("Conversation summary update failed")
+        finally:
+            with self._lock:
+                self._pending.discard(digests[-1])
+
+    def stats(self):
+        with self._lock:
+            return {"summaries": len(self._summaries), "pending": len(self._pending), "updates": self.updates,
+                    "failures": self.failures}
+
+
+conversation_memory = ConversationMemory()
@@ -0,0 +1,216 @@
+"""Minimal Prometheus-style metrics, rendered in the text exposition format.
+
+Each metric keeps a dict of label values -> value guarded by its own lock, so
+recording is a dict update under an uncontended lock and scraping needs no
+external service.
+"""
+import bisect
+import math
+import threading
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket (non-cumulative) counts + overflow, sum, count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def quantile(self, q, **labels):
+        """Estimate a quantile by linear interpolation inside the buckets, like histogram_quantile()"""
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None or state[2] == 0:
+                return None
+            counts, count = list(state[0]), state[2]
+        rank = q * count
+        cumulative = 0
+        for i, bucket_count in enumerate(counts):
+            if cumulative + bucket_count >= rank and bucket_count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                if i == len(self.buckets):
+                    return lower
+                return lower + (self.buckets[i] - lower) * (rank - cumulative) / bucket_count
+            cumulative += bucket_count
+        return self.buckets[-1]
+
+    def _render_sample(self, key, state):
+        counts, total, count = state
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.label_names, key, [("le", _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.label_names, key)
+        lines.append(f"{self.name}_sum{labels} {total}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+    def render(self):
+        """Histogram samples, followed by a gauge family of p50/p95/p99 estimates"""
+        lines = super().render()
+        with self._lock:
+            keys = sorted(self._values)
+        if keys:
+            lines += [f"# HELP {self.name}_quantile p50/p95/p99 estimated from the {self.name} buckets",
+                      f"# TYPE {self.name}_quantile gauge"]
+            for key in keys:
+                for q in (0.5, 0.95, 0.99):
+                    estimate = self.quantile(q, **dict(zip(self.label_names, key)))
+                    labels = _format_labels(self.label_names, key, [("quantile", q)])
+                    lines.append(f"{self.name}_quantile{labels} {estimate}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labels=()):
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name, help_text, labels=()):
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register a callable run at scrape time to refresh gauges"""
+        self._collectors.append(collect)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+REQUEST_LABELS = ("endpoint", "model_name", "model_provider", "agent_mode", "allow_search")
+
+requests_total = metrics.counter(
+    "chat_requests_total", "Chat requests by outcome", REQUEST_LABELS + ("status",))
+requests_in_flight = metrics.gauge(
+    "chat_requests_in_flight", "Chat requests currently running", REQUEST_LABELS)
+request_duration = metrics.histogram(
+    "chat_request_duration_seconds", "End-to-end chat request latency", REQUEST_LABELS)
+phase_duration = metrics.histogram(
+    "agent_phase_duration_seconds", "Latency of each pipeline phase",
+    ("model_name", "model_provider", "agent_mode", "phase", "allow_search"))
+provider_errors = metrics.counter(
+    "provider_errors_total", "Errors raised by model providers", ("model_name", "model_provider", "kind"))
+provider_rate_limited = metrics.counter(
+    "provider_rate_limited_total", "Provider calls rejected with a rate limit (429)", ("model_name", "model_provider"))
+
+
+def classify_provider_error(error):
+    """Return "rate_limit", "server" or "other" for a provider exception"""
+    status = getattr(error, "status_code", None) or getattr(error, "code", None)
+    response = getattr(error, "response", None)
+    if status is None and response is not None:
+        status = getattr(response, "status_code", None)
+    text = f"{type(error).__name__} {error}".lower()
+    if status == 429 or "rate limit" in text or "ratelimit" in text or "resourceexhausted" in text or "429" in text:
+        return "rate_limit"
+    if isinstance(status, int) and 500 <= status < 600:
+        return "server"
+    return "other"
+
+
+def record_provider_error(error, model_name, model_provider):
+    kind = classify_provider_error(error)
+    provider_errors.inc(model_name=model_name, model_provider=model_provider, kind=kind)
+    if kind == "rate_limit":
+        provider_rate_limited.inc(model_name=model_name, model_provider=model_provider)
+    return kind
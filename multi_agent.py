@@ -1,31 +1,167 @@
 import os
-from dotenv import load_dotenv
-load_dotenv()
+import asyncio
+import time
 
-from langchain_groq import ChatGroq
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_tavily import TavilySearch
-from langchain.agents import create_agent
+# Importing the registry loads .env once for the whole process
+from llm_registry import registry
 from langchain_core.messages.ai import AIMessage
 from langchain_core.messages import HumanMessage
+from streaming import astream_agent
+from instrumentation import UsageTracker, ToolTimingHandler
+from compaction import COMPACTION, compact, compaction_stats, context_budget
+from hedging import hedge_policy
+from ratelimit import rate_limits, prompt_tokens
+from semantic_cache import HashedNgramEmbedder
+from graph import AGENT_GRAPHS, Graph, Node, get_graph, load_graphs, register_graph, run_graph
 
-GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
+DEBATE_CONCURRENCY = int(os.environ.get("DEBATE_CONCURRENCY", "3"))
+# "shared": one research pass feeds tool-free perspectives; "per_agent": each perspective may search
+DEBATE_RESEARCH = os.environ.get("DEBATE_RESEARCH", "shared")
+DEBATE_SEARCH_RESULTS = int(os.environ.get("DEBATE_SEARCH_RESULTS", "3"))
+# Agreement (mean pairwise similarity of the perspectives) at which the mediator is skipped or kept short
+DEBATE_EARLY_EXIT = os.environ.get("DEBATE_EARLY_EXIT", "on") == "on"
+DEBATE_SKIP_MEDIATOR_AGREEMENT = float(os.environ.get("DEBATE_SKIP_MEDIATOR_AGREEMENT", "0.9"))
+DEBATE_SHORT_MEDIATOR_AGREEMENT = float(os.environ.get("DEBATE_SHORT_MEDIATOR_AGREEMENT", "0.75"))
+# Draft the consensus from the early perspectives while the slowest one finishes
+DEBATE_INCREMENTAL_MEDIATOR = os.environ.get("DEBATE_INCREMENTAL_MEDIATOR", "on") == "on"
+
+
+def format_search_results(results):
+    """Render TavilySearch output as bullet points with their source URLs"""
+    if isinstance(results, dict) and isinstance(results.get("results"), list):
+        lines = []
+        for r in results["results"]:
+            lines.append(f"- {r.get('title', '')}: {r.get('content', '')} (Source: {r.get('url', '')})")
+        return "\n".join(lines) or "No search results."
+    return str(results)
+
+
+# Words only: character trigrams make any two texts on the same topic look alike
+_agreement_embedder = HashedNgramEmbedder(char_weight=0.0)
+
+
+def agreement(responses):
+    """(mean pairwise cosine similarity, index of the most central response) of a list of texts"""
+    vectors = [_agreement_embedder.embed(r) for r in responses]
+    n = len(vectors)
+    if n < 2:
+        return 1.0, 0
+    similarity = [[float(vectors[i] @ vectors[j]) for j in range(n)] for i in range(n)]
+    pairs = [similarity[i][j] for i in range(n) for j in range(i + 1, n)]
+    centrality = [sum(similarity[i][j] for j in range(n) if j != i) for i in range(n)]
+    return sum(pairs) / len(pairs), centrality.index(max(centrality))
 
 class MultiAgentOrchestrator:
-    def __init__(self, llm_id, provider, allow_search=True):
-        """Initialize the multi-agent system with specified LLM"""
-        self.llm = self._get_llm(llm_id, provider)
+    def __init__(self, llm_id, provider, allow_search=True, debate_concurrency=DEBATE_CONCURRENCY, emit=None,
+                 debate_research=DEBATE_RESEARCH, compaction=COMPACTION, history=None):
+        """Initialize the multi-agent system with specified LLM.
+
+        emit is an optional async callback receiving phase events as each
+        phase starts and completes, and token events while the final phase
+        (writer or mediator) is generating. history is the earlier
+        conversation as role/content messages, already fitted to the model's
+        memory budget (see memory.py); every agent sees it ahead of its own
+        prompt.
+        """
+        self.llm_id = llm_id
+        self.provider = provider
+        self.llm = registry.get_llm(llm_id, provider)
         self.allow_search = allow_search
+        self.debate_concurrency = max(1, debate_concurrency)
+        self.emit = emit
+        self.debate_research = debate_research
+        self.compaction = compaction
+        self.history = list(history or [])
+        self.tracker = UsageTracker()
+        self.hedges = []
+        self.consensus = None
+    
+    async def _record_step(self, steps, step, output=None):
+        """Timestamp a phase transition, keep it in steps and emit it live.
+
+        The live event also carries the output of a completed phase.
+        """
+        step["timestamp"] = time.time()
+        steps.append(step)
+        if self.emit:
+            event = {"type": "phase", **step}
+            if output is not None:
+                event["output"] = output
+            await self.emit(event)
+        
+    async def _run_agent(self, system_prompt, tools, query, fallback, phase, agent_name=None, stream=False,
+                         with_history=True):
+        """Invoke a cached agent for this model and return its last AI message.
+
+        The invocation is recorded in self.tracker under phase. When stream is
+        set and an emit callback was given, tokens are emitted as they are
+        generated. Conversation history goes before the query so the prompt
+        prefix stays the same from one turn to the next. Slow or failing calls
+        are hedged or failed over per hedge_policy and noted in self.hedges;
+        every call, hedges included, is paced by the provider rate limits.
+        """
+        state = {"messages": [*self.history, query] if with_history else [query]}
+        tool_timer = ToolTimingHandler()
+        config = {"callbacks": [tool_timer]}
+        streaming = bool(self.emit and stream)
+        emitted = False
+        input_tokens = prompt_tokens(system_prompt, state["messages"])
+
+        async def on_token(text):
+            nonlocal emitted
+            emitted = True
+            await self.emit({"type": "token", "phase": phase, "text": text})
+
+        async def call(provider, llm_id):
+            agent = registry.get_agent(llm_id, provider, system_prompt, tools)
+
+            async def invoke():
+                if streaming:
+                    return await astream_agent(agent, state, on_token, config=config)
+                return await agent.ainvoke(state, config=config)
+            return await rate_limits.run(provider, llm_id, invoke, input_tokens, can_retry=lambda: not emitted)
+
+        started = time.perf_counter()
+        response, hedge = await hedge_policy.run(phase, self.provider, self.llm_id, call, hedge=not streaming,
+                                                 can_failover=lambda: not emitted)
+        if hedge is not None:
+            self.hedges.append({**hedge, "agent": agent_name or phase})
+        messages = response.get("messages")
+        self.tracker.record(phase, agent_name or phase, started, time.perf_counter(), messages, tool_timer.tool_calls,
+                            model=hedge["model"] if hedge else self.llm_id,
+                            provider=hedge["provider"] if hedge else self.provider)
+        ai_messages = [msg.content for msg in messages if isinstance(msg, AIMessage)]
         
-    def _get_llm(self, llm_id, provider):
-        """Get the appropriate LLM based on provider"""
-        if provider == "Groq":
-            return ChatGroq(model=llm_id)
-        elif provider == "Gemini":
-            return ChatGoogleGenerativeAI(model=llm_id, google_api_key=GEMINI_API_KEY)
+        return ai_messages[-1] if ai_messages else fallback
+    
+    async def _compact_context(self, text, budget, query):
+        """Fit text into a token budget before handing it to the next agent.
+
+        Uses cheap extractive compaction, falling back to an LLM summary only
+        when extraction cannot reach the budget. Returns (text, stats).
+        """
+        if not self.compaction:
+            return text, None
+        compacted, fits = compact(text, budget, query)
+        method = "extractive" if compacted != text else "none"
+        if not fits:
+            summary_prompt = f"""You are a Summarizer. Condense the text to at most {budget} tokens:
+        1. Keep every fact, number and date relevant to the question
+        2. Merge duplicate points
+        3. Keep all source URLs
+        
+        Format: Return ONLY the condensed bullet points."""
+            compacted = await self._run_agent(summary_prompt, [], f"Question: {query}\n\nText:\n{text}", compacted, "compaction",
+                                              with_history=False)
+            method = "llm"
+        return compacted, compaction_stats(text, compacted, method)
     
-    def research_agent(self, query):
-        """Agent specialized in RAW DATA COLLECTION ONLY"""
+    async def research_agent(self, query, search_results=None):
+        """Agent specialized in RAW DATA COLLECTION ONLY.
+
+        With search_results given, the facts are extracted from those results
+        in a single tool-free call instead of letting the agent search.
+        """
         research_prompt = """You are a Data Collector. Your ONLY job is to:
         1. Find and extract RAW facts, statistics, and information
         2. List sources and URLs when using web search
@@ -35,22 +171,20 @@ class MultiAgentOrchestrator:
         
         Format: Return ONLY factual data points with sources."""
         
-        tools = [TavilySearch(max_results=1)] if self.allow_search else []
-        
-        agent = create_agent(
-            model=self.llm,
-            tools=tools,
-            system_prompt=research_prompt
-        )
+        if search_results is not None:
+            extraction_query = f"""Question: {query}
+
+Web Search Results:
+{format_search_results(search_results)}
+
+Collect the raw facts relevant to the question from these results."""
+            return await self._run_agent(research_prompt, [], extraction_query, "No research data found.", "research")
         
-        state = {"messages": [query]}
-        response = agent.invoke(state)
-        messages = response.get("messages")
-        ai_messages = [msg.content for msg in messages if isinstance(msg, AIMessage)]
+        tools = [registry.get_search_tool(max_results=1)] if self.allow_search else []
         
-        return ai_messages[-1] if ai_messages else "No research data found."
+        return await self._run_agent(research_prompt, tools, query, "No research data found.", "research")
     
-    def analyzer_agent(self, research_data, original_query):
+    async def analyzer_agent(self, research_data, original_query):
         """Agent specialized in CRITICAL ANALYSIS ONLY"""
         analysis_prompt = """You are a Critical Analyst. Your job is to:
         1. Identify PATTERNS and TRENDS in the raw data
@@ -66,12 +200,6 @@ class MultiAgentOrchestrator:
         - Contradictions/Gaps:
         - Credibility Assessment:"""
         
-        agent = create_agent(
-            model=self.llm,
-            tools=[],
-            system_prompt=analysis_prompt
-        )
-        
         analysis_query = f"""Original Query: {original_query}
 
 Raw Research Data:
@@ -79,14 +207,9 @@ Raw Research Data:
 
 Analyze this data critically. DO NOT answer the question - just analyze the data."""
         
-        state = {"messages": [analysis_query]}
-        response = agent.invoke(state)
-        messages = response.get("messages")
-        ai_messages = [msg.content for msg in messages if isinstance(msg, AIMessage)]
-        
-        return ai_messages[-1] if ai_messages else "No analysis available."
+        return await self._run_agent(analysis_prompt, [], analysis_query, "No analysis available.", "analysis")
     
-    def writer_agent(self, research_data, analysis, original_query):
+    async def writer_agent(self, research_data, analysis, original_query):
         """Agent specialized in SYNTHESIS and COMMUNICATION"""
         writer_prompt = """You are a Professional Communicator. Your job is to:
         1. SYNTHESIZE the research data and analysis into a coherent answer
@@ -98,12 +221,6 @@ Analyze this data critically. DO NOT answer the question - just analyze the data
         
         Format: Write a complete, well-structured response that actually answers the user's question."""
         
-        agent = create_agent(
-            model=self.llm,
-            tools=[],
-            system_prompt=writer_prompt
-        )
-        
         writing_query = f"""Original User Question: {original_query}
 
 Raw Research Data:
@@ -114,73 +231,21 @@ Critical Analysis:
 
 Now write a comprehensive answer to the user's question using the research and analysis above."""
         
-        state = {"messages": [writing_query]}
-        response = agent.invoke(state)
-        messages = response.get("messages")
-        ai_messages = [msg.content for msg in messages if isinstance(msg, AIMessage)]
-        
-        return ai_messages[-1] if ai_messages else "Unable to generate response."
+        return await self._run_agent(writer_prompt, [], writing_query, "Unable to generate response.", "writing", stream=True)
     
-    def debate_mode(self, query):
-        """Multiple agents debate and reach consensus"""
-        steps = []
-        
-        perspectives = [
-            {
-                "name": "Optimist",
-                "emoji": "🌟",
-                "prompt": "You are an optimistic analyst. Focus on positive aspects, opportunities, success stories, and future potential. Be hopeful but balanced."
-            },
-            {
-                "name": "Skeptic",
-                "emoji": "⚠️",
-                "prompt": "You are a critical skeptic. Focus on risks, downsides, past failures, and limitations. Be cautious but fair."
-            },
-            {
-                "name": "Neutral",
-                "emoji": "📊",
-                "prompt": "You are an objective analyst. Present facts without bias, weigh pros and cons equally, use evidence-based reasoning."
-            }
-        ]
-        
-        debate_responses = []
-        tools = [TavilySearch(max_results=1)] if self.allow_search else []
-        
-        # Each agent gives their perspective
-        for p in perspectives:
-            steps.append({
-                "phase": "debate",
-                "agent": p["name"],
-                "status": "in_progress",
-                "message": f"{p['emoji']} **{p['name']} Agent** is analyzing..."
-            })
-            
-            agent = create_agent(model=self.llm, tools=tools, system_prompt=p["prompt"])
-            state = {"messages": [query]}
-            response = agent.invoke(state)
-            messages = response.get("messages")
-            ai_messages = [msg.content for msg in messages if isinstance(msg, AIMessage)]
-            
-            debate_responses.append({
-                "agent": p["name"],
-                "emoji": p["emoji"],
-                "response": ai_messages[-1] if ai_messages else "No response"
-            })
-            
-            steps.append({
-                "phase": "debate",
-                "agent": p["name"],
-                "status": "completed",
-                "message": f"✅ **{p['name']} Agent** shared perspective"
-            })
-        
-        # Mediator synthesizes consensus
-        steps.append({
-            "phase": "consensus",
-            "status": "in_progress",
-            "message": "⚖️ **Mediator** is building consensus..."
-        })
-        
+    
+    async def shared_research(self, query):
+        """One search and one fact collection, shared by every debate perspective"""
+        search_tool = registry.get_search_tool(max_results=DEBATE_SEARCH_RESULTS)
+        search_started = time.perf_counter()
+        search_results = await search_tool.ainvoke({"query": query})
+        search_finished = time.perf_counter()
+        self.tracker.record("research", search_tool.name, search_started, search_finished,
+                            tool_timings=[(search_tool.name, search_finished - search_started)])
+        return await self.research_agent(query, search_results=search_results)
+    
+    async def mediator_agent(self, query, perspectives):
+        """Agent synthesizing the debate perspectives, a list of (name, response), into consensus"""
         mediator_prompt = """You are a Mediator. Synthesize all perspectives:
         1. Summarize each viewpoint fairly
         2. Identify points of AGREEMENT
@@ -190,88 +255,323 @@ Now write a comprehensive answer to the user's question using the research and a
         
         Format with clear sections: Agreement, Disagreement, Conclusion, Recommendation."""
         
-        mediator = create_agent(model=self.llm, tools=[], system_prompt=mediator_prompt)
-        
         debate_summary = "\n\n".join([
-            f"**{r['agent']}:**\n{r['response']}" for r in debate_responses
+            f"**{name}:**\n{response}" for name, response in perspectives
         ])
         
         mediator_query = f"Question: {query}\n\nPerspectives:\n{debate_summary}\n\nSynthesize into consensus."
         
-        state = {"messages": [mediator_query]}
-        response = mediator.invoke(state)
-        messages = response.get("messages")
-        ai_messages = [msg.content for msg in messages if isinstance(msg, AIMessage)]
+        return await self._run_agent(mediator_prompt, [], mediator_query, "Unable to reach consensus", "consensus", stream=True)
+    
+    async def short_mediator_agent(self, query, perspectives):
+        """Brief consensus for perspectives that largely agree, over compacted copies of them"""
+        short_prompt = """You are a Mediator. The perspectives below largely agree:
+        1. State the shared conclusion in a few sentences
+        2. Note any remaining caveat or disagreement in one or two bullets
+        3. Give the final recommendation
         
-        consensus = ai_messages[-1] if ai_messages else "Unable to reach consensus"
+        Format: Keep it under 200 words."""
         
-        steps.append({
-            "phase": "consensus",
-            "status": "completed",
-            "message": "✅ **Mediator** reached conclusion"
-        })
+        budget = context_budget(self.llm_id) // max(1, len(perspectives))
+        debate_summary = "\n\n".join([
+            f"**{name}:**\n{compact(response, budget, query)[0]}" for name, response in perspectives
+        ])
         
-        return {
-            "final_response": consensus,
-            "debate_responses": debate_responses,
-            "steps": steps,
-            "metadata": {
-                "mode": "debate",
-                "agents_participated": 4,
-                "search_enabled": self.allow_search
-            }
-        }
+        mediator_query = f"Question: {query}\n\nPerspectives:\n{debate_summary}\n\nState the consensus briefly."
+        
+        return await self._run_agent(short_prompt, [], mediator_query, "Unable to reach consensus", "consensus", stream=True)
     
-    def process_query(self, query):
-        """Main orchestration method that coordinates all agents"""
-        steps = []
+    async def mediator_draft(self, query, perspectives):
+        """Draft consensus over the perspectives that have arrived so far; not streamed"""
+        draft_prompt = """You are a Mediator. Draft a synthesis of the perspectives so far:
+        1. Summarize each viewpoint fairly
+        2. Identify points of AGREEMENT
+        3. Identify points of DISAGREEMENT
+        4. Provide a provisional conclusion
+        
+        Format with clear sections: Agreement, Disagreement, Conclusion."""
         
-        # Step 1: Research
-        steps.append({
-            "phase": "research",
-            "status": "in_progress",
-            "message": "🔍 **Research Agent** is collecting raw data and facts..."
-        })
-        research_result = self.research_agent(query)
-        steps.append({
-            "phase": "research",
-            "status": "completed",
-            "message": "✅ **Research Agent** collected data from multiple sources"
-        })
+        debate_summary = "\n\n".join([
+            f"**{name}:**\n{response}" for name, response in perspectives
+        ])
+        
+        draft_query = f"Question: {query}\n\nPerspectives so far:\n{debate_summary}\n\nDraft a consensus; one more perspective will follow."
+        
+        return await self._run_agent(draft_prompt, [], draft_query, "", "consensus", agent_name="Mediator draft")
+    
+    async def mediator_update(self, query, draft, name, response):
+        """Final consensus from a draft plus the perspective that arrived last"""
+        update_prompt = """You are a Mediator. Revise a draft consensus to account for one more perspective:
+        1. Keep what still holds in the draft
+        2. Add the new perspective's points of AGREEMENT and DISAGREEMENT
+        3. Update the conclusion if the new perspective changes it
+        4. Give final recommendation
         
-        # Step 2: Analysis
-        steps.append({
-            "phase": "analysis",
-            "status": "in_progress",
-            "message": "🧠 **Analyzer Agent** is finding patterns and insights..."
-        })
-        analysis_result = self.analyzer_agent(research_result, query)
-        steps.append({
-            "phase": "analysis",
-            "status": "completed",
-            "message": "✅ **Analyzer Agent** identified key insights and patterns"
-        })
+        Format with clear sections: Agreement, Disagreement, Conclusion, Recommendation."""
         
-        # Step 3: Writing
-        steps.append({
-            "phase": "writing",
-            "status": "in_progress",
-            "message": "✍️ **Writer Agent** is synthesizing the final response..."
-        })
-        final_result = self.writer_agent(research_result, analysis_result, query)
-        steps.append({
-            "phase": "writing",
-            "status": "completed",
-            "message": "✅ **Writer Agent** completed the comprehensive response"
-        })
+        update_query = f"Question: {query}\n\nDraft consensus:\n{draft}\n\nNew perspective:\n**{name}:**\n{response}\n\nWrite the final consensus."
         
-        return {
-            "final_response": final_result,
-            "research_data": research_result,
-            "analysis": analysis_result,
-            "steps": steps,
-            "metadata": {
-                "total_agents": 3,
-                "search_enabled": self.allow_search
-            }
-        }
\ No newline at end of file
+        return await self._run_agent(update_prompt, [], update_query, "Unable to reach consensus", "consensus", stream=True)
+    
+    async def arun_graph(self, mode, query):
+        """Run the pipeline graph registered as mode (see graph.py)"""
+        graph = get_graph(mode, self)
+        if graph is None:
+            raise ValueError(f"Unknown agent_mode: {mode}")
+        self.tracker = UsageTracker()
+        self.hedges = []
+        outputs, steps, timeouts = await run_graph(graph, self, query)
+        result = graph.finish(self, query, outputs, steps, graph)
+        result["metadata"]["hedging"] = self.hedges
+        if timeouts:
+            result["metadata"]["timeouts"] = timeouts
+        result.update(self.tracker.summary())
+        return result
+    
+    def debate_mode(self, query):
+        """Synchronous wrapper around adebate_mode"""
+        return asyncio.run(self.adebate_mode(query))
+    
+    async def adebate_mode(self, query):
+        """Multiple agents debate and reach consensus"""
+        return await self.arun_graph("debate", query)
+    
+    def process_query(self, query):
+        """Synchronous wrapper around aprocess_query"""
+        return asyncio.run(self.aprocess_query(query))
+    
+    async def aprocess_query(self, query):
+        """Main orchestration method that coordinates all agents"""
+        return await self.arun_graph("sequential", query)
+
+
+PERSPECTIVES = [
+    {
+        "name": "Optimist",
+        "emoji": "🌟",
+        "prompt": "You are an optimistic analyst. Focus on positive aspects, opportunities, success stories, and future potential. Be hopeful but balanced."
+    },
+    {
+        "name": "Skeptic",
+        "emoji": "⚠️",
+        "prompt": "You are a critical skeptic. Focus on risks, downsides, past failures, and limitations. Be cautious but fair."
+    },
+    {
+        "name": "Neutral",
+        "emoji": "📊",
+        "prompt": "You are an objective analyst. Present facts without bias, weigh pros and cons equally, use evidence-based reasoning."
+    }
+]
+
+
+async def _compact_for_analysis(orchestrator, query, inputs):
+    return await orchestrator._compact_context(inputs["research"], context_budget(orchestrator.llm_id), query)
+
+
+# The writer sees both inputs, so each gets half of the budget
+async def _compact_research_for_writing(orchestrator, query, inputs):
+    return await orchestrator._compact_context(inputs["research"], context_budget(orchestrator.llm_id) // 2, query)
+
+
+async def _compact_analysis_for_writing(orchestrator, query, inputs):
+    return await orchestrator._compact_context(inputs["analysis"], context_budget(orchestrator.llm_id) // 2, query)
+
+
+def _finish_sequential(orchestrator, query, outputs, steps, graph):
+    result = {
+        "final_response": outputs["writing"],
+        "research_data": outputs["research"],
+        "analysis": outputs["analysis"],
+        "steps": steps,
+        "metadata": {
+            "total_agents": 3,
+            "search_enabled": orchestrator.allow_search
+        }
+    }
+    if orchestrator.compaction:
+        research_stats = outputs["analysis_context"][1]
+        writing_research_stats = outputs["writing_research_context"][1]
+        writing_analysis_stats = outputs["writing_analysis_context"][1]
+        writing_stats = [writing_research_stats, writing_analysis_stats]
+        result["metadata"]["compaction"] = {
+            "budget_tokens": context_budget(orchestrator.llm_id),
+            "analysis": research_stats,
+            "writing": {
+                "research": writing_research_stats,
+                "analysis": writing_analysis_stats,
+                "saved_tokens": sum(s["saved_tokens"] for s in writing_stats)
+            },
+            "saved_tokens": research_stats["saved_tokens"] + sum(s["saved_tokens"] for s in writing_stats)
+        }
+    return result
+
+
+# Research -> analysis -> writing; compacting the research for the writer overlaps with the analysis
+SEQUENTIAL_GRAPH = Graph("sequential", [
+    Node("research", run=lambda o, query, inputs: o.research_agent(query),
+         start_message="🔍 **Research Agent** is collecting raw data and facts...",
+         done_message="✅ **Research Agent** collected data from multiple sources"),
+    Node("analysis_context", run=_compact_for_analysis, inputs=["research"], phase="compaction"),
+    Node("analysis", run=lambda o, query, inputs: o.analyzer_agent(inputs["analysis_context"][0], query),
+         inputs=["analysis_context"],
+         start_message="🧠 **Analyzer Agent** is finding patterns and insights...",
+         done_message="✅ **Analyzer Agent** identified key insights and patterns"),
+    Node("writing_research_context", run=_compact_research_for_writing, inputs=["research"], phase="compaction"),
+    Node("writing_analysis_context", run=_compact_analysis_for_writing, inputs=["analysis"], phase="compaction"),
+    Node("writing", run=lambda o, query, inputs: o.writer_agent(inputs["writing_research_context"][0],
+                                                                 inputs["writing_analysis_context"][0], query),
+         inputs=["writing_research_context", "writing_analysis_context"],
+         start_message="✍️ **Writer Agent** is synthesizing the final response...",
+         done_message="✅ **Writer Agent** completed the comprehensive response"),
+], output="writing", finish=_finish_sequential)
+
+
+NO_RESEARCH = "No web research was run for this question; work from the material in the question and general knowledge."
+
+
+async def _compact_analysis_alone(orchestrator, query, inputs):
+    return await orchestrator._compact_context(inputs["analysis"], context_budget(orchestrator.llm_id), query)
+
+
+def _finish_analysis(orchestrator, query, outputs, steps, graph):
+    result = {
+        "final_response": outputs["writing"],
+        "analysis": outputs["analysis"],
+        "steps": steps,
+        "metadata": {
+            "total_agents": 2,
+            "search_enabled": False
+        }
+    }
+    if orchestrator.compaction:
+        writing_stats = outputs["writing_context"][1]
+        result["metadata"]["compaction"] = {
+            "budget_tokens": context_budget(orchestrator.llm_id),
+            "writing": {"analysis": writing_stats, "saved_tokens": writing_stats["saved_tokens"]},
+            "saved_tokens": writing_stats["saved_tokens"]
+        }
+    return result
+
+
+# Analysis -> writing for questions that need reasoning but no research
+ANALYSIS_GRAPH = Graph("analysis", [
+    Node("analysis", run=lambda o, query, inputs: o.analyzer_agent(NO_RESEARCH, query),
+         start_message="🧠 **Analyzer Agent** is reasoning over the question (no research needed)...",
+         done_message="✅ **Analyzer Agent** identified key insights and patterns"),
+    Node("writing_context", run=_compact_analysis_alone, inputs=["analysis"], phase="compaction"),
+    Node("writing", run=lambda o, query, inputs: o.writer_agent(NO_RESEARCH, inputs["writing_context"][0], query),
+         inputs=["writing_context"],
+         start_message="✍️ **Writer Agent** is synthesizing the final response...",
+         done_message="✅ **Writer Agent** completed the comprehensive response"),
+], output="writing", finish=_finish_analysis)
+
+
+async def _consensus(orchestrator, query, inputs):
+    """Mediator node, started as soon as the first perspective arrives.
+
+    While the slowest perspective is still running, a draft consensus is
+    built from the others; if it is ready when the last one arrives, only
+    that perspective is folded in. Perspectives that agree strongly skip the
+    mediator (the most central one is returned) or get a short mediator.
+    """
+    names = list(inputs)
+    waiting = {future: name for name, future in inputs.items()}
+    arrived, order = {}, []
+    draft_task = None
+    try:
+        while waiting:
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                name = waiting.pop(future)
+                arrived[name] = future.result()
+                order.append(name)
+            # The draft runs beside the last perspective, so it needs room under the concurrency cap
+            if DEBATE_INCREMENTAL_MEDIATOR and orchestrator.debate_concurrency > 1 and len(waiting) == 1 \
+                    and len(arrived) >= 2 and draft_task is None:
+                draft_task = asyncio.create_task(orchestrator.mediator_draft(query, [(n, arrived[n]) for n in order]))
+        perspectives = [(name, arrived[name]) for name in names]
+        score, central = agreement([response for _, response in perspectives]) if DEBATE_EARLY_EXIT else (0.0, 0)
+        stats = {"agreement": round(score, 3) if DEBATE_EARLY_EXIT else None, "draft": None}
+        draft_ready = draft_task is not None and draft_task.done() and not draft_task.cancelled() and \
+            draft_task.exception() is None and draft_task.result()
+        if draft_task is not None and not draft_ready:
+            # Still running when the last perspective arrived: waiting for it would not beat a fresh mediator
+            draft_task.cancel()
+            stats["draft"] = "discarded"
+        if DEBATE_EARLY_EXIT and score >= DEBATE_SKIP_MEDIATOR_AGREEMENT:
+            name, response = perspectives[central]
+            consensus = f"All perspectives largely agree; the {name} view represents them best.\n\n{response}"
+            stats["method"] = "skipped"
+        elif DEBATE_EARLY_EXIT and score >= DEBATE_SHORT_MEDIATOR_AGREEMENT:
+            consensus = await orchestrator.short_mediator_agent(query, perspectives)
+            stats["method"] = "short"
+        elif draft_ready:
+            consensus = await orchestrator.mediator_update(query, draft_task.result(), order[-1], arrived[order[-1]])
+            stats.update(method="incremental", draft="used")
+        else:
+            consensus = await orchestrator.mediator_agent(query, perspectives)
+            stats["method"] = "full"
+        if draft_ready and stats["method"] != "incremental":
+            stats["draft"] = "discarded"
+        orchestrator.consensus = stats
+        return consensus
+    finally:
+        if draft_task is not None and not draft_task.done():
+            draft_task.cancel()
+
+
+def _finish_debate(orchestrator, query, outputs, steps, graph):
+    shared_research = "research" in outputs
+    mediated = orchestrator.consensus["method"] != "skipped"
+    result = {
+        "final_response": outputs["consensus"],
+        "debate_responses": [{"agent": p["name"], "emoji": p["emoji"], "response": outputs[p["name"]]}
+                             for p in PERSPECTIVES],
+        "steps": steps,
+        "metadata": {
+            "mode": "debate",
+            "agents_participated": len(PERSPECTIVES) + shared_research + mediated,
+            "search_enabled": orchestrator.allow_search,
+            "research": "shared" if shared_research else "per_agent",
+            "consensus": orchestrator.consensus
+        }
+    }
+    if shared_research:
+        result["research_data"] = outputs["research"]
+    return result
+
+
+def debate_graph(orchestrator):
+    """Perspectives run concurrently (up to debate_concurrency) while the mediator builds consensus as they arrive"""
+    nodes = []
+    if orchestrator.allow_search and orchestrator.debate_research == "shared":
+        nodes.append(Node("research", run=lambda o, query, inputs: o.shared_research(query),
+                          start_message="🔍 **Research Agent** is collecting shared facts for the debate...",
+                          done_message="✅ **Research Agent** shared its findings with the debaters"))
+        perspective_inputs = ["research"]
+        template = """Question: {query}
+
+Shared Research (facts and sources):
+{research}
+
+Give your perspective on the question, grounded in the research above."""
+    else:
+        perspective_inputs = []
+        template = "{query}"
+    for p in PERSPECTIVES:
+        nodes.append(Node(p["name"], prompt=p["prompt"], inputs=perspective_inputs, template=template,
+                          tools=not perspective_inputs, phase="debate", agent=p["name"], fallback="No response",
+                          start_message=f"{p['emoji']} **{p['name']} Agent** is analyzing...",
+                          done_message=f"✅ **{p['name']} Agent** shared perspective"))
+    names = [p["name"] for p in PERSPECTIVES]
+    nodes.append(Node("consensus", inputs=names, run=_consensus, eager=True,
+                      start_message="⚖️ **Mediator** is building consensus...",
+                      done_message="✅ **Mediator** reached conclusion"))
+    return Graph("debate", nodes, "consensus", finish=_finish_debate, concurrency=orchestrator.debate_concurrency)
+
+
+register_graph("sequential", SEQUENTIAL_GRAPH)
+register_graph("analysis", ANALYSIS_GRAPH)
+register_graph("debate", debate_graph)
+if AGENT_GRAPHS:
+    load_graphs(AGENT_GRAPHS)
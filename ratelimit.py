@@ -0,0 +1,399 @@
+"""Per-(provider, model) request/token rate limiting for agent calls.
+
+Every agent invocation reserves one request and its estimated tokens from two
+token buckets (requests per minute, tokens per minute). Reservations are
+handed out in arrival order, so callers wait their turn (a fair FIFO queue)
+instead of racing each other into the provider's 429s. After the call the
+reservation is settled with the real LLM-call count and token usage.
+
+A 429 pauses the whole (provider, model) for its Retry-After and the call is
+retried with jittered exponential backoff, as are 5xx and connection errors.
+Repeated outage errors open a circuit breaker that fails calls fast until a
+trial call succeeds. When retries run out, callers get ProviderThrottled or
+CircuitOpen, which the API turns into 429/503 with a Retry-After header.
+"""
+import asyncio
+import math
+import os
+import random
+import re
+import threading
+import time
+
+from compaction import estimate_tokens
+from instrumentation import message_usage
+from metrics import metrics, classify_provider_error
+
+RATE_LIMITING = os.environ.get("RATE_LIMITING", "on") == "on"
+# "key=rpm/tpm" pairs; key is a model name or a provider name. Unset means no quotas, only retries and
+# the circuit breaker. Free-tier accounts can use e.g. "Groq=30/6000,Gemini=15/1000000,gemini-2.5-pro=5/250000".
+RATE_LIMITS = os.environ.get("RATE_LIMITS", "")
+RATE_LIMIT_MAX_WAIT = float(os.environ.get("RATE_LIMIT_MAX_WAIT", "30"))
+RATE_LIMIT_OUTPUT_TOKENS = int(os.environ.get("RATE_LIMIT_OUTPUT_TOKENS", "500"))
+RATE_LIMIT_MAX_RETRIES = int(os.environ.get("RATE_LIMIT_MAX_RETRIES", "3"))
+RATE_LIMIT_BASE_DELAY = float(os.environ.get("RATE_LIMIT_BASE_DELAY", "0.5"))
+RATE_LIMIT_MAX_DELAY = float(os.environ.get("RATE_LIMIT_MAX_DELAY", "20"))
+CIRCUIT_FAILURES = int(os.environ.get("CIRCUIT_FAILURES", "5"))
+CIRCUIT_RESET = float(os.environ.get("CIRCUIT_RESET", "30"))
+
+_RETRY_IN_RE = re.compile(r"(?:try again|retry) in (\d+(?:\.\d+)?)\s*(ms|s)", re.IGNORECASE)
+
+LIMIT_LABELS = ("model_provider", "model_name")
+queue_depth = metrics.gauge(
+    "provider_rate_limit_queue_depth", "Agent calls waiting for a provider rate-limit reservation", LIMIT_LABELS)
+queue_wait = metrics.histogram(
+    "provider_rate_limit_wait_seconds", "Time agent calls waited for a provider rate-limit reservation", LIMIT_LABELS)
+retries = metrics.counter(
+    "provider_retries_total", "Provider calls retried after a rate limit or outage error", LIMIT_LABELS + ("kind",))
+circuit_open = metrics.gauge(
+    "provider_circuit_open", "1 while the provider circuit breaker is open", LIMIT_LABELS)
+
+
+class ProviderUnavailable(Exception):
+    """A provider call that could not be made or completed; retry_after is in seconds"""
+    status_code = 503
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class ProviderThrottled(ProviderUnavailable):
+    status_code = 429
+
+
+class CircuitOpen(ProviderUnavailable):
+    status_code = 503
+
+
+def parse_limits(spec):
+    limits = {}
+    for pair in spec.split(","):
+        key, _, value = pair.partition("=")
+        rpm, _, tpm = value.partition("/")
+        if key.strip() and rpm.strip():
+            limits[key.strip()] = (float(rpm), float(tpm) if tpm.strip() else None)
+    return limits
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait, from a Retry-After header or the error text, else None"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    match = _RETRY_IN_RE.search(str(error))
+    if match:
+        seconds = float(match.group(1))
+        return seconds / 1000 if match.group(2).lower() == "ms" else seconds
+    return None
+
+
+def classify(error):
+    """"rate_limit", "outage" (retryable 5xx/connection/timeout) or "other" """
+    kind = classify_provider_error(error)
+    if kind == "server":
+        return "outage"
+    name = type(error).__name__
+    if kind == "other" and any(word in name for word in ("Timeout", "Connection", "Unavailable")):
+        return "outage"
+    return kind
+
+
+class TokenBucket:
+    """Refills at per_minute / 60 per second up to per_minute; the level may go negative for reservations"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, cost, now):
+        """Debit cost and return how long until the bucket has covered it"""
+        self._refill(now)
+        self.level -= min(cost, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, delta, now):
+        """Debit (positive) or refund (negative) tokens after the fact"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level - delta)
+
+    def drain(self, now):
+        self._refill(now)
+        self.level = min(self.level, 0.0)
+
+
+class CircuitBreaker:
+    """Opens after consecutive outage errors, then lets one trial call through after reset seconds"""
+
+    def __init__(self, failures=CIRCUIT_FAILURES, reset=CIRCUIT_RESET):
+        self.failures_to_open = failures
+        self.reset = reset
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def check(self, now):
+        """Return None if a call may go ahead, else seconds until the next trial"""
+        if self.opened_at is None:
+            return None
+        remaining = self.opened_at + self.reset - now
+        if remaining > 0 or self.trial_running:
+            return max(remaining, 1.0)
+        self.trial_running = True
+        return None
+
+    def success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    def failure(self, now):
+        self.failures += 1
+        self.trial_running = False
+        if self.opened_at is not None or self.failures >= self.failures_to_open:
+            self.opened_at = now
+
+
+class ProviderLimiter:
+    """Request and token buckets, throttle window and circuit breaker for one (provider, model)"""
+
+    def __init__(self, provider, model, rpm=None, tpm=None, max_wait=RATE_LIMIT_MAX_WAIT):
+        self.provider = provider
+        self.model = model
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.max_wait = max_wait
+        self.breaker = CircuitBreaker()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.labels = {"model_provider": provider, "model_name": model}
+        self.waiting = 0
+        self.calls = 0
+        self.throttled = 0
+        self.wait_seconds = 0.0
+
+    def reserve(self, tokens):
+        """Reserve one request and tokens; return (delay before the call may start, whether it is the breaker's trial)"""
+        now = time.monotonic()
+        with self._lock:
+            wait = self.breaker.check(now)
+            if wait is not None:
+                raise CircuitOpen(f"{self.provider} {self.model} circuit open after repeated errors", wait)
+            trial = self.breaker.opened_at is not None
+            delay = max(0.0, self.blocked_until - now)
+            if self.requests:
+                delay = max(delay, self.requests.reserve(1, now))
+            if self.tokens:
+                delay = max(delay, self.tokens.reserve(tokens, now))
+            if delay > self.max_wait:
+                self._settle(now, -1, -tokens)
+                self.breaker.trial_running = False
+                raise ProviderThrottled(f"Rate limit queue for {self.provider} {self.model} is {delay:.0f}s long",
+                                        delay)
+            self.calls += 1
+            self.wait_seconds += delay
+        queue_wait.observe(delay, **self.labels)
+        return delay, trial
+
+    def _settle(self, now, requests, tokens):
+        if self.requests and requests:
+            self.requests.adjust(requests, now)
+        if self.tokens and tokens:
+            self.tokens.adjust(tokens, now)
+
+    def settle(self, reserved_tokens, llm_calls, used_tokens):
+        """Correct a reservation with the real number of LLM calls and tokens"""
+        with self._lock:
+            self._settle(time.monotonic(), max(0, llm_calls - 1), used_tokens - reserved_tokens)
+
+    def cancel(self, reserved_tokens):
+        """Return a reservation that was never used"""
+        with self._lock:
+            self._settle(time.monotonic(), -1, -reserved_tokens)
+
+    def end_trial(self):
+        """The breaker's trial call ended without an outcome (e.g. it was cancelled): let the next call try"""
+        with self._lock:
+            self.breaker.trial_running = False
+
+    def throttle(self, seconds):
+        """The provider answered 429: hold every caller back for seconds"""
+        now = time.monotonic()
+        with self._lock:
+            self.throttled += 1
+            self.blocked_until = max(self.blocked_until, now + seconds)
+            for bucket in (self.requests, self.tokens):
+                if bucket:
+                    bucket.drain(now)
+
+    def record_outcome(self, kind):
+        """Feed the breaker: only outage errors count, any other answer shows the provider is up"""
+        with self._lock:
+            if kind == "outage":
+                self.breaker.failure(time.monotonic())
+            else:
+                self.breaker.success()
+            circuit_open.set(1 if self.breaker.opened_at is not None else 0, **self.labels)
+
+    def stats(self):
+        with self._lock:
+            return {"waiting": self.waiting, "calls": self.calls, "throttled": self.throttled,
+                    "avg_wait": round(self.wait_seconds / self.calls, 3) if self.calls else 0.0,
+                    "circuit_open": self.breaker.opened_at is not None}
+
+
+class RateLimits:
+    """Shared ProviderLimiters plus the retry loop wrapped around every agent call"""
+
+    def __init__(self, enabled=RATE_LIMITING, limits=None, max_retries=RATE_LIMIT_MAX_RETRIES,
+                 base_delay=RATE_LIMIT_BASE_DELAY, max_delay=RATE_LIMIT_MAX_DELAY, output_tokens=RATE_LIMIT_OUTPUT_TOKENS):
+        self.enabled = enabled
+        self.limits = parse_limits(RATE_LIMITS) if limits is None else dict(limits)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.output_tokens = output_tokens
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, model):
+        with self._lock:
+            limiter = self._limiters.get((provider, model))
+            if limiter is None:
+                rpm, tpm = self.limits.get(model) or self.limits.get(provider) or (None, None)
+                limiter = self._limiters[(provider, model)] = ProviderLimiter(provider, model, rpm, tpm)
+            return limiter
+
+    def estimate(self, prompt_tokens):
+        return prompt_tokens + self.output_tokens
+
+    def backoff(self, attempt):
+        """Full-jitter exponential backoff"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _retry_delay(self, limiter, error, attempt, can_retry):
+        """Seconds to wait before retrying error, or raise if it should not be retried"""
+        kind = classify(error)
+        limiter.record_outcome(kind)
+        if kind == "rate_limit":
+            wait = retry_after(error)
+            limiter.throttle(wait if wait is not None else self.backoff(attempt + 1))
+        elif kind != "outage":
+            raise error
+        if attempt >= self.max_retries or (can_retry is not None and not can_retry()):
+            if kind == "rate_limit":
+                raise ProviderThrottled(f"Rate limit from {limiter.provider} {limiter.model}: {error}",
+                                        max(1.0, limiter.blocked_until - time.monotonic())) from error
+            raise ProviderUnavailable(f"{limiter.provider} {limiter.model} unavailable: {error}",
+                                      self.base_delay * 2 ** attempt) from error
+        retries.inc(kind=kind, **limiter.labels)
+        # Rate-limit waits come from the throttle window on the next reservation
+        return self.backoff(attempt)
+
+    def _succeeded(self, limiter, reserved, response):
+        limiter.record_outcome(None)
+        usage = message_usage(response.get("messages") if isinstance(response, dict) else None)
+        limiter.settle(reserved, usage["llm_calls"], usage["total_tokens"] or reserved)
+
+    async def run(self, provider, model, invoke, prompt_tokens, can_retry=None):
+        """Await invoke() under the (provider, model) limits, retrying throttles and outages"""
+        if not self.enabled:
+            return await invoke()
+        limiter = self.get(provider, model)
+        reserved = self.estimate(prompt_tokens)
+        attempt = 0
+        while True:
+            delay, trial = limiter.reserve(reserved)
+            try:
+                if delay:
+                    limiter.waiting += 1
+                    queue_depth.inc(**limiter.labels)
+                    try:
+                        await asyncio.sleep(delay)
+                    except asyncio.CancelledError:
+                        limiter.cancel(reserved)
+                        raise
+                    finally:
+                        limiter.waiting -= 1
+                        queue_depth.dec(**limiter.labels)
+                try:
+                    response = await invoke()
+                except Exception as e:
+                    # _retry_delay records the outcome, which ends the trial
+                    trial = False
+                    retry_delay = self._retry_delay(limiter, e, attempt, can_retry)
+                else:
+                    trial = False
+                    self._succeeded(limiter, reserved, response)
+                    return response
+            finally:
+                if trial:
+                    # Cancelled before an outcome (hedge loser, node timeout, client gone)
+                    limiter.end_trial()
+            await asyncio.sleep(retry_delay)
+            attempt += 1
+
+    def run_sync(self, provider, model, invoke, prompt_tokens):
+        """Blocking counterpart of run"""
+        if not self.enabled:
+            return invoke()
+        limiter = self.get(provider, model)
+        reserved = self.estimate(prompt_tokens)
+        attempt = 0
+        while True:
+            delay, trial = limiter.reserve(reserved)
+            try:
+                if delay:
+                    limiter.waiting += 1
+                    queue_depth.inc(**limiter.labels)
+                    try:
+                        time.sleep(delay)
+                    finally:
+                        limiter.waiting -= 1
+                        queue_depth.dec(**limiter.labels)
+                try:
+                    response = invoke()
+                except Exception as e:
+                    trial = False
+                    retry_delay = self._retry_delay(limiter, e, attempt, None)
+                else:
+                    trial = False
+                    self._succeeded(limiter, reserved, response)
+                    return response
+            finally:
+                if trial:
+                    limiter.end_trial()
+            time.sleep(retry_delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {f"{l.provider}/{l.model}": l.stats() for l in limiters}
+
+
+def prompt_tokens(system_prompt, messages):
+    """Rough input size of an agent call: system prompt plus str or role/content messages"""
+    total = estimate_tokens(system_prompt or "")
+    for message in messages:
+        total += estimate_tokens(message if isinstance(message, str) else str(message.get("content", "")))
+    return total
+
+
+def retry_after_header(error):
+    """Retry-After header value for a ProviderUnavailable"""
+    return str(max(1, math.ceil(error.retry_after)))
+
+
+rate_limits = RateLimits()
@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_BACKEND = os.environ.get("RESPONSE_CACHE_BACKEND", "memory")  # "memory", "sqlite" or "off"
+RESPONSE_CACHE_PATH = os.environ.get("RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "1000"))
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "3600"))
+# Web search results go stale quickly, so those responses expire sooner
+RESPONSE_CACHE_SEARCH_TTL = float(os.environ.get("RESPONSE_CACHE_SEARCH_TTL", "300"))
+
+KEY_FIELDS = ("model_name", "model_provider", "system_prompt", "messages", "allow_search", "use_multi_agent", "agent_mode",
+              "debate_research", "force_full_pipeline")
+
+
+def _normalize_text(text):
+    return " ".join(text.split())
+
+
+def cache_key(request):
+    """Stable hash of the request fields that affect the response"""
+    fields = {name: getattr(request, name) for name in KEY_FIELDS}
+    fields["system_prompt"] = _normalize_text(fields["system_prompt"] or "")
+    fields["messages"] = [_normalize_text(m) for m in fields["messages"]]
+    fields["use_multi_agent"] = bool(fields["use_multi_agent"])
+    if not fields["use_multi_agent"]:
+        # agent_mode, debate_research and routing are ignored by the single-agent path
+        fields["agent_mode"] = None
+        fields["debate_research"] = None
+        fields["force_full_pipeline"] = None
+    else:
+        # system_prompt is ignored by the multi-agent path
+        fields["system_prompt"] = None
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheBackend:
+    """In-process LRU store with per-entry expiry"""
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, expires_at, stored_at, value):
+        with self._lock:
+            self._entries[key] = (expires_at, stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk store that survives restarts, evicting least recently used entries"""
+
+    def __init__(self, path=RESPONSE_CACHE_PATH, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, expires_at REAL, stored_at REAL, last_access REAL, value TEXT)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+        self._conn.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, stored_at, value FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= now:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            return row[0], row[1], json.loads(row[2])
+
+    def set(self, key, expires_at, stored_at, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, expires_at, stored_at, last_access, value) VALUES (?, ?, ?, ?, ?)",
+                (key, expires_at, stored_at, stored_at, json.dumps(value)),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at <= ?", (stored_at,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+class ResponseCache:
+    """TTL cache of /chat responses keyed on the normalized request"""
+
+    def __init__(self, backend, ttl=RESPONSE_CACHE_TTL, search_ttl=RESPONSE_CACHE_SEARCH_TTL):
+        self.backend = backend
+        self.ttl = ttl
+        self.search_ttl = search_ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, request):
+        """Return (response, age_in_seconds), or None on a miss"""
+        entry = self.backend.get(cache_key(request))
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        _, stored_at, value = entry
+        return value, time.time() - stored_at
+
+    def set(self, request, response):
+        if "error" in response:
+            return
+        now = time.time()
+        ttl = self.search_ttl if request.allow_search else self.ttl
+        self.backend.set(cache_key(request), now + ttl, now, response)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.backend)}
+
+
+def create_response_cache(backend=RESPONSE_CACHE_BACKEND):
+    """Build the configured cache, or None when caching is off"""
+    if backend == "off":
+        return None
+    if backend == "sqlite":
+        return ResponseCache(SQLiteCacheBackend())
+    return ResponseCache(MemoryCacheBackend())
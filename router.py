@@ -0,0 +1,101 @@
+"""Complexity-aware routing for multi-agent requests.
+
+The full research -> analysis -> writing pipeline costs three LLM calls and a
+web search, which is wasted on "what is 2+2". route_query classifies a query
+with local heuristics, no model call, and picks the cheapest path that should
+still answer it well:
+
+- fast: trivial queries (arithmetic, greetings, short timeless definitions)
+  get one call to the provider's fast model, without search
+- single: short factual lookups get one call to the requested model, which
+  may search
+- analysis: queries that bring their own material, or ask for reasoning with
+  search disabled, skip research and run analysis -> writing
+- full: everything else runs the whole pipeline
+
+Only the sequential pipeline is routed; debate and custom graphs run as
+requested. ROUTING=off, or force_full_pipeline on a request, always runs the
+full pipeline.
+"""
+import os
+import re
+
+from compaction import estimate_tokens
+from metrics import metrics
+
+ROUTING = os.environ.get("ROUTING", "on") == "on"
+# "provider=model" pairs; providers without one use the requested model for the fast route
+FAST_MODELS = os.environ.get("FAST_MODELS", "Groq=groq/compound-mini,Gemini=gemini-2.0-flash")
+# Queries up to this many tokens count as short
+ROUTE_SHORT_TOKENS = int(os.environ.get("ROUTE_SHORT_TOKENS", "25"))
+# Queries carrying at least this many tokens of their own material skip research
+ROUTE_MATERIAL_TOKENS = int(os.environ.get("ROUTE_MATERIAL_TOKENS", "300"))
+
+ROUTES = ("fast", "single", "analysis", "full")
+
+# The multi-agent path ignores the request's system prompt, so routed single calls do too
+ROUTED_SYSTEM_PROMPT = "You are a helpful assistant. Answer the question directly, accurately and concisely."
+
+_ARITHMETIC_RE = re.compile(r"^(?:what(?:'s| is)|calculate|compute|solve)?[\d\s.,+\-*/x×÷^()%=]+\??$", re.I)
+_GREETING_RE = re.compile(r"^(?:hi|hello|hey|thanks|thank you|good (?:morning|afternoon|evening))\b[\s\w,!.]{0,20}$", re.I)
+_DEFINITION_RE = re.compile(r"^(?:what(?:'s| is| are| does)|define|meaning of|how do you spell)\b", re.I)
+# Wording that asks for facts a model may not know without searching
+_FRESH_RE = re.compile(r"\b(?:latest|today|tonight|current(?:ly)?|now|recent(?:ly)?|news|this (?:week|month|year)|"
+                       r"prices?|stocks?|20\d\d|trend(?:s|ing)?|updates?|statistics|stats|forecast|release[sd]?)\b",
+                       re.I)
+# Wording that asks for reasoning rather than a single fact
+_ANALYTIC_RE = re.compile(r"\b(?:compare|comparison|versus|vs\.?|pros and cons|trade-?offs?|analy[sz]e|evaluate|assess|"
+                          r"impact|implications?|strateg(?:y|ies)|should|worth|recommend|why|"
+                          r"how (?:does|do|can|should|would)|explain|plan|risks?|advantages|disadvantages)\b", re.I)
+
+routes_total = metrics.counter("chat_routes_total", "Multi-agent requests by the route they took", ("route",))
+
+
+def parse_fast_models(spec):
+    fast_models = {}
+    for pair in spec.split(","):
+        provider, _, model = pair.partition("=")
+        if provider.strip() and model.strip():
+            fast_models[provider.strip()] = model.strip()
+    return fast_models
+
+
+_fast_models = parse_fast_models(FAST_MODELS)
+
+
+def fast_model(provider, llm_id):
+    return _fast_models.get(provider, llm_id)
+
+
+def route_query(query, allow_search):
+    """Return (route, reason) for a query; route is one of ROUTES"""
+    text = query.strip()
+    tokens = estimate_tokens(text)
+    fresh = _FRESH_RE.search(text)
+    analytic = _ANALYTIC_RE.search(text)
+
+    if _ARITHMETIC_RE.match(text) and any(c.isdigit() for c in text):
+        return "fast", "arithmetic"
+    if _GREETING_RE.match(text):
+        return "fast", "greeting"
+    if tokens >= ROUTE_MATERIAL_TOKENS and not fresh:
+        return "analysis", f"query supplies its own material ({tokens} tokens), no fresh facts asked for"
+    if analytic:
+        if not allow_search and not fresh:
+            return "analysis", f"reasoning question ('{analytic.group(0)}') with search disabled"
+        return "full", f"needs research and analysis ('{analytic.group(0)}')"
+    if tokens <= ROUTE_SHORT_TOKENS:
+        if fresh:
+            return "single", f"short lookup of fresh facts ('{fresh.group(0)}')"
+        if _DEFINITION_RE.match(text):
+            return "fast", "short definition"
+        return "single", "short factual question"
+    return "full", "open-ended query"
+
+
+def choose_route(query, allow_search, force_full_pipeline=None):
+    """route_query unless routing is off for this request; counts the route taken"""
+    force = not ROUTING if force_full_pipeline is None else force_full_pipeline
+    route, reason = ("full", "full pipeline forced") if force else route_query(query, allow_search)
+    routes_total.inc(route=route)
+    return route, reason
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Optional
+
+from langchain_core.tools import BaseTool
+
+SEARCH_CACHE_TTL = float(os.environ.get("SEARCH_CACHE_TTL", "600"))
+SEARCH_CACHE_SIZE = int(os.environ.get("SEARCH_CACHE_SIZE", "512"))
+
+
+def search_key(tool_name, max_results, kwargs):
+    """Cache key for a search call; queries are compared case- and whitespace-insensitively"""
+    args = {k: v for k, v in kwargs.items() if v is not None}
+    args["query"] = " ".join(str(args.get("query", "")).lower().split())
+    return json.dumps([tool_name, max_results, args], sort_keys=True, default=str)
+
+
+class SearchCache:
+    """TTL/LRU cache of search results that also collapses identical in-flight searches.
+
+    Concurrent callers asking for the same key wait for the first call instead
+    of issuing their own request. Failures are propagated to every waiter and
+    are never cached.
+    """
+
+    def __init__(self, ttl=SEARCH_CACHE_TTL, max_entries=SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._async_in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def _store(self, key, result):
+        if isinstance(result, dict) and result.get("error"):
+            return
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_run(self, key, func):
+        """Return the cached result for key, running func() at most once across threads"""
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None:
+                return entry[1]
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = func()
+            self._store(key, result)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    async def aget_or_run(self, key, coro_func):
+        """Async variant of get_or_run for callers on the event loop"""
+        with self._lock:
+            entry = self._get(key)
+            if entry is not None:
+                return entry[1]
+            task = self._async_in_flight.get(key)
+            if task is None:
+                self.misses += 1
+                task = asyncio.ensure_future(coro_func())
+                self._async_in_flight[key] = task
+                task.add_done_callback(lambda t: self._finish_async(key, t))
+            else:
+                self.coalesced += 1
+        # shield() so one cancelled waiter does not cancel the search for the others
+        return await asyncio.shield(task)
+
+    def _finish_async(self, key, task):
+        with self._lock:
+            self._async_in_flight.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._store(key, task.result())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "entries": len(self._entries),
+            }
+
+
+search_cache = SearchCache()
+
+
+class CachedSearchTool(BaseTool):
+    """Wraps a search tool (e.g. TavilySearch) with the shared SearchCache.
+
+    Exposes the same name, description and arguments as the wrapped tool so
+    agents see no difference.
+    """
+
+    inner: BaseTool
+    cache: Any = None
+    max_results: Optional[int] = None
+
+    def __init__(self, inner, cache=None, **kwargs):
+        super().__init__(
+            inner=inner,
+            cache=cache or search_cache,
+            max_results=getattr(inner, "max_results", None),
+            name=inner.name,
+            description=inner.description,
+            args_schema=inner.args_schema,
+            **kwargs,
+        )
+
+    def _run(self, run_manager=None, **kwargs):
+        key = search_key(self.name, self.max_results, kwargs)
+        return self.cache.get_or_run(key, lambda: self.inner.invoke(kwargs))
+
+    async def _arun(self, run_manager=None, **kwargs):
+        key = search_key(self.name, self.max_results, kwargs)
+        return await self.cache.aget_or_run(key, lambda: self.inner.ainvoke(kwargs))
@@ -0,0 +1,147 @@
+import os
+import re
+import threading
+import time
+import zlib
+
+SEMANTIC_CACHE = os.environ.get("SEMANTIC_CACHE", "off") == "on"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_SIZE = int(os.environ.get("SEMANTIC_CACHE_SIZE", "2000"))
+SEMANTIC_CACHE_TTL = float(os.environ.get("SEMANTIC_CACHE_TTL", "3600"))
+
+# Fields of a pipeline result that are served from the cache
+CACHED_FIELDS = ("final_response", "research_data", "analysis", "debate_responses")
+
+# Direction words are dropped as words but kept attached to the word after them, so "from AWS to Azure"
+# and "from Azure to AWS" differ
+DIRECTION_WORDS = frozenset(("from", "to", "into", "than"))
+STOPWORDS = frozenset("""
+a an the and or but if of in on at by for with about as is are was were be been being
+do does did i me my we our you your it its this that these those which who whom what when where why how
+should would could can will shall may might must vs versus then so just please tell
+""".split()) | DIRECTION_WORDS
+# Connectors whose two sides can swap without changing the question
+SYMMETRIC_WORDS = frozenset(("and", "or", "vs", "versus"))
+
+_WORD_RE = re.compile(r"[a-z0-9+#]+")
+
+
+class HashedNgramEmbedder:
+    """Offline text embedder: hashed word unigrams, character trigrams and word-order features.
+
+    Stopwords are dropped, so rewordings such as "How do I bake bread?" and
+    "How can I bake bread?" land close together. Word order is kept by
+    bigrams of adjacent words and by pairing each direction word with the
+    word after it, so "Is Python faster than Java?" and "Is Java faster than
+    Python?" do not. A bigram across "and", "or" or "vs" is order-free, since
+    "Python or JavaScript" asks the same as "JavaScript or Python", while any
+    other dropped word between two words breaks their bigram, so "Should I
+    learn Python or JavaScript?" still matches "python vs javascript, which to
+    learn?".
+    """
+
+    def __init__(self, dim=2048, char_weight=0.5, bigram_weight=0.8):
+        self.dim = dim
+        self.char_weight = char_weight
+        self.bigram_weight = bigram_weight
+
+    def _bucket(self, feature):
+        return zlib.crc32(feature.encode("utf-8")) % self.dim
+
+    def embed(self, text):
+        import numpy as np
+        vector = np.zeros(self.dim, dtype=np.float32)
+        previous, symmetric, direction = None, False, None
+        for word in _WORD_RE.findall(text.lower()):
+            if word in STOPWORDS:
+                if word in DIRECTION_WORDS:
+                    previous, direction = None, word
+                elif word in SYMMETRIC_WORDS:
+                    symmetric = True
+                else:
+                    previous = None
+                continue
+            vector[self._bucket("w:" + word)] += 1.0
+            padded = f"#{word}#"
+            for j in range(len(padded) - 2):
+                vector[self._bucket("c:" + padded[j:j + 3])] += self.char_weight
+            if previous is not None:
+                pair = (previous, word)
+                vector[self._bucket("b:" + " ".join(sorted(pair) if symmetric else pair))] += self.bigram_weight
+            if direction is not None:
+                vector[self._bucket(f"d:{direction} {word}")] += self.bigram_weight
+            previous, symmetric, direction = word, False, None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SemanticCache:
+    """Near-duplicate query cache over a cosine-similarity vector index.
+
+    Entries are partitioned by (provider, model, mode, allow_search) so a hit
+    never crosses a model or pipeline boundary.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE,
+                 ttl=SEMANTIC_CACHE_TTL, embedder=None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.embedder = embedder or HashedNgramEmbedder()
+        self._lock = threading.Lock()
+        self._vectors = None  # created on first store so NumPy is only imported when the cache is used
+        self._entries = []  # (partition, query, expires_at, result), aligned with _vectors rows
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, query, provider, model, mode, allow_search):
+        """Return (result, similarity, matched_query) for the closest match above the threshold, else None"""
+        import numpy as np
+        partition = (provider, model, mode, allow_search)
+        vector = self.embedder.embed(query)
+        now = time.time()
+        with self._lock:
+            self._expire(now)
+            if not self._entries:
+                self.misses += 1
+                return None
+            scores = self._vectors @ vector
+            mask = np.array([entry[0] == partition for entry in self._entries])
+            scores = np.where(mask, scores, -1.0)
+            best = int(np.argmax(scores))
+            if scores[best] < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            _, matched_query, _, result = self._entries[best]
+            return result, float(scores[best]), matched_query
+
+    def store(self, query, provider, model, mode, allow_search, result):
+        if "error" in result:
+            return
+        import numpy as np
+        cached = {field: result[field] for field in CACHED_FIELDS if field in result}
+        vector = self.embedder.embed(query)
+        entry = ((provider, model, mode, allow_search), query, time.time() + self.ttl, cached)
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = vector[None, :]
+            else:
+                self._vectors = np.vstack([self._vectors, vector[None, :]])
+            self._entries.append(entry)
+            if len(self._entries) > self.max_entries:
+                # Oldest entries go first
+                overflow = len(self._entries) - self.max_entries
+                self._vectors = self._vectors[overflow:]
+                self._entries = self._entries[overflow:]
+
+    def _expire(self, now):
+        keep = [i for i, entry in enumerate(self._entries) if entry[2] > now]
+        if len(keep) != len(self._entries):
+            self._vectors = self._vectors[keep]
+            self._entries = [self._entries[i] for i in keep]
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries),
+                    "threshold": self.threshold}
@@ -0,0 +1,160 @@
+"""Server-side conversation sessions.
+
+A session holds its model settings and the ordered list of turns, so clients
+send only the new message each turn. Active sessions live in an in-memory LRU;
+sessions pushed out of it are spilled to SQLite and loaded back on next use.
+
+History is append-only and always rendered in the same order after the same
+system prompt, so consecutive turns share a byte-identical prompt prefix that
+providers with implicit prompt caching (Gemini 2.5, Groq) can reuse.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+import weakref
+from collections import OrderedDict
+
+SESSION_MEMORY_SIZE = int(os.environ.get("SESSION_MEMORY_SIZE", "256"))
+SESSION_STORE_PATH = os.environ.get("SESSION_STORE_PATH", "sessions.sqlite3")
+SESSION_MAX_STORED = int(os.environ.get("SESSION_MAX_STORED", "10000"))
+SESSION_TTL = float(os.environ.get("SESSION_TTL", str(7 * 24 * 3600)))
+# Oldest turns beyond this are dropped from the stored history
+SESSION_MAX_TURNS = int(os.environ.get("SESSION_MAX_TURNS", "200"))
+
+SETTINGS_FIELDS = ("model_name", "model_provider", "system_prompt", "allow_search", "use_multi_agent", "agent_mode",
+                   "debate_research", "force_full_pipeline")
+
+
+def history_messages(turns):
+    """Role/content messages for an agent, in conversation order"""
+    return [{"role": turn["role"], "content": turn["content"]} for turn in turns]
+
+
+class SessionStore:
+    """Bounded session store: in-memory LRU with a SQLite spill for evicted sessions"""
+
+    def __init__(self, path=SESSION_STORE_PATH, memory_size=SESSION_MEMORY_SIZE, max_stored=SESSION_MAX_STORED,
+                 ttl=SESSION_TTL, max_turns=SESSION_MAX_TURNS):
+        self.memory_size = memory_size
+        self.max_stored = max_stored
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        # One lock per live session so concurrent turns append in order
+        self._turn_locks = weakref.WeakValueDictionary()
+        self.path = path
+        self._conn = None
+        self.spilled = 0
+        self.loaded = 0
+
+    def _db(self):
+        """SQLite connection, opened on first use so idle servers create no file"""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, updated_at REAL, value TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+            self._conn.commit()
+        return self._conn
+
+    def create(self, settings):
+        now = time.time()
+        session = {"id": uuid.uuid4().hex, "created_at": now, "updated_at": now,
+                   "settings": {field: settings.get(field) for field in SETTINGS_FIELDS}, "turns": []}
+        with self._lock:
+            self._remember(session)
+        return session
+
+    def get(self, session_id):
+        """Return the session, loading it back from SQLite if it was spilled, else None"""
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                if session["updated_at"] + self.ttl <= now:
+                    del self._sessions[session_id]
+                    return None
+                self._sessions.move_to_end(session_id)
+                return session
+            if self._conn is None and not os.path.exists(self.path):
+                return None
+            db = self._db()
+            row = db.execute("SELECT updated_at, value FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None or row[0] + self.ttl <= now:
+                return None
+            db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            db.commit()
+            session = json.loads(row[1])
+            self.loaded += 1
+            self._remember(session)
+            return session
+
+    def append(self, session_id, *turns):
+        """Append turns ({"role", "content", ...}) to a session; returns the session or None"""
+        session = self.get(session_id)
+        if session is None:
+            return None
+        now = time.time()
+        with self._lock:
+            for turn in turns:
+                session["turns"].append({"timestamp": now, **turn})
+            if len(session["turns"]) > self.max_turns:
+                del session["turns"][:len(session["turns"]) - self.max_turns]
+            session["updated_at"] = now
+        return session
+
+    def delete(self, session_id):
+        with self._lock:
+            found = self._sessions.pop(session_id, None) is not None
+            db = self._db()
+            cursor = db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            db.commit()
+            return found or cursor.rowcount > 0
+
+    def turn_lock(self, session_id):
+        """asyncio.Lock serializing turns of one session"""
+        with self._lock:
+            lock = self._turn_locks.get(session_id)
+            if lock is None:
+                lock = self._turn_locks[session_id] = asyncio.Lock()
+            return lock
+
+    def flush(self):
+        """Spill every in-memory session to SQLite, e.g. before shutdown"""
+        with self._lock:
+            if not self._sessions:
+                return
+            while self._sessions:
+                self._spill(*self._sessions.popitem(last=False))
+            self._db().commit()
+
+    def _remember(self, session):
+        self._sessions[session["id"]] = session
+        self._sessions.move_to_end(session["id"])
+        if len(self._sessions) > self.memory_size:
+            while len(self._sessions) > self.memory_size:
+                self._spill(*self._sessions.popitem(last=False))
+            self._db().commit()
+
+    def _spill(self, session_id, session):
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO sessions (id, updated_at, value) VALUES (?, ?, ?)",
+                   (session_id, session["updated_at"], json.dumps(session)))
+        db.execute("DELETE FROM sessions WHERE updated_at <= ?", (time.time() - self.ttl,))
+        db.execute(
+            "DELETE FROM sessions WHERE id IN (SELECT id FROM sessions ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_stored,),
+        )
+        self.spilled += 1
+
+    def stats(self):
+        with self._lock:
+            stored = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] if self._conn else 0
+            return {"in_memory": len(self._sessions), "spilled_stored": stored, "spilled": self.spilled,
+                    "loaded": self.loaded}
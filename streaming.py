@@ -0,0 +1,26 @@
+import json
+
+from langchain_core.messages.ai import AIMessageChunk
+
+
+async def astream_agent(agent, state, on_token, config=None):
+    """Run an agent, passing each model token to on_token as it is produced.
+
+    Returns the final graph state, the same shape agent.ainvoke() returns.
+    """
+    final_state = {}
+    async for mode, data in agent.astream(state, config=config, stream_mode=["messages", "values"]):
+        if mode == "values":
+            final_state = data
+            continue
+        chunk, metadata = data
+        if isinstance(chunk, AIMessageChunk) and metadata.get("langgraph_node") == "model":
+            text = chunk.text
+            if text:
+                await on_token(text)
+    return final_state
+
+
+def sse_event(event):
+    """Encode an event dict as a server-sent-events frame"""
+    return f"data: {json.dumps(event, default=str)}\n\n"
@@ -0,0 +1,38 @@
+import asyncio
+
+import pytest
+
+from batch import BatchRunner, read_jsonl
+
+
+def test_non_object_lines_are_rejected_up_front():
+    assert read_jsonl(['{"model_provider": "Groq"}', "", '{"model_provider": "Gemini"}']) == [
+        (0, {"model_provider": "Groq"}), (1, {"model_provider": "Gemini"})]
+    with pytest.raises(ValueError, match="line 2"):
+        read_jsonl(['{"model_provider": "Groq"}', '["not", "an", "object"]'])
+
+
+def test_runners_sharing_semaphores_share_the_provider_cap():
+    async def main():
+        running, peak = 0, 0
+
+        async def run_one(record):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+            return {"final_response": "ok"}
+
+        semaphores = {}
+        items = [(i, {"model_provider": "Groq"}) for i in range(6)]
+
+        async def upload():
+            runner = BatchRunner(run_one, provider_concurrency=2, semaphores=semaphores)
+            return [entry async for entry in runner.run(items)]
+
+        results = await asyncio.gather(upload(), upload(), upload())
+        assert all(entry["status"] == "ok" for entries in results for entry in entries)
+        assert peak == 2
+
+    asyncio.run(main())
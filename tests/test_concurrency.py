@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from concurrency import SingleFlight
+
+
+class Boom(Exception):
+    pass
+
+
+def test_identical_calls_share_one_execution():
+    async def main():
+        flight, calls = SingleFlight(), []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return "result"
+
+        assert await asyncio.gather(*(flight.do("k", work) for _ in range(5))) == ["result"] * 5
+        assert calls == [1]
+        assert flight.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+    asyncio.run(main())
+
+
+def test_an_error_reaches_every_waiter():
+    async def main():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.02)
+            raise Boom("provider down")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(result, Boom) for result in results)
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
+
+
+def test_work_survives_one_cancelled_waiter_and_stops_after_the_last():
+    async def main():
+        flight, started, finished = SingleFlight(), [], []
+
+        async def work():
+            task = asyncio.current_task()
+            started.append(task)
+            await asyncio.sleep(0.1)
+            finished.append(task)
+            return "result"
+
+        first = asyncio.create_task(flight.do("k", work))
+        second = asyncio.create_task(flight.do("k", work))
+        await asyncio.sleep(0.02)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await second == "result"
+        assert len(started) == 1 and len(finished) == 1
+
+        third = asyncio.create_task(flight.do("other", work))
+        fourth = asyncio.create_task(flight.do("other", work))
+        await asyncio.sleep(0.02)
+        third.cancel()
+        fourth.cancel()
+        await asyncio.gather(third, fourth, return_exceptions=True)
+        await asyncio.sleep(0)
+        assert started[1].cancelled()
+        assert len(finished) == 1
+        assert flight.stats()["in_flight"] == 0
+
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+import asyncio
+
+from graph import Graph, Node, run_graph
+
+
+class StubOrchestrator:
+    allow_search = False
+
+    async def _record_step(self, steps, step, output=None):
+        steps.append(step)
+
+
+def sleeper(seconds, output):
+    async def run(orchestrator, query, inputs):
+        await asyncio.sleep(seconds)
+        return output
+    return run
+
+
+async def gather_inputs(orchestrator, query, inputs):
+    values = [await future for future in inputs.values()]
+    await asyncio.sleep(0.05)
+    return "+".join(values)
+
+
+def test_eager_node_timeout_starts_when_its_inputs_are_ready():
+    graph = Graph("eager", [
+        Node("fast", run=sleeper(0.05, "a")),
+        Node("slow", run=sleeper(0.3, "b")),
+        Node("join", run=gather_inputs, inputs=["fast", "slow"], eager=True, timeout=0.2),
+    ], "join")
+    outputs, _, timeouts = asyncio.run(run_graph(graph, StubOrchestrator(), "q"))
+    assert outputs["join"] == "a+b"
+    assert timeouts == []
+
+
+def test_eager_node_still_times_out_on_its_own_work():
+    async def slow_join(orchestrator, query, inputs):
+        await asyncio.gather(*inputs.values())
+        await asyncio.sleep(1)
+
+    graph = Graph("eager", [
+        Node("fast", run=sleeper(0.01, "a")),
+        Node("join", run=slow_join, inputs=["fast"], eager=True, timeout=0.05, fallback="late"),
+    ], "join")
+    outputs, _, timeouts = asyncio.run(run_graph(graph, StubOrchestrator(), "q"))
+    assert outputs["join"] == "late"
+    assert timeouts == [{"node": "join", "timeout": 0.05}]
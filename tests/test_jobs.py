@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from jobs import JobManager, JobStore
+
+
+def recording_run_job(executions, name, seconds=0.1):
+    async def run_job(request, emit):
+        executions.append(name)
+        await asyncio.sleep(seconds)
+        return {"response": name}
+    return run_job
+
+
+async def wait_finished(manager, job_id, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = manager.get(job_id)
+        if job["status"] in ("succeeded", "failed", "cancelled"):
+            return job
+        await asyncio.sleep(0.02)
+    raise AssertionError(f"job {job_id} did not finish")
+
+
+def test_a_job_runs_once_across_managers_sharing_a_store(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        executions = []
+        a = JobManager(recording_run_job(executions, "A"), store=store, workers=2, interactive_workers=0)
+        job = await a.submit({"query": "q"}, "default")
+        await asyncio.sleep(0.02)
+        # A second process starting up while A runs the job must leave it alone
+        b = JobManager(recording_run_job(executions, "B"), store=store, workers=2, interactive_workers=0)
+        b.get(job["id"])
+        finished = await wait_finished(a, job["id"])
+        await asyncio.sleep(0.05)
+        assert finished["status"] == "succeeded"
+        assert executions == ["A"]
+
+    asyncio.run(main())
+
+
+def test_jobs_of_a_stopped_process_are_taken_over_once_their_lease_expires(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        stopped = store.create({"query": "q"}, "default", owner="gone", lease=0.1)
+        store.update(stopped["id"], status="running", started_at=time.time())
+        executions = []
+        manager = JobManager(recording_run_job(executions, "B"), store=store, workers=2, interactive_workers=0,
+                             lease=0.15)
+        assert manager.get(stopped["id"])["status"] == "running"
+        await asyncio.sleep(0.02)
+        assert executions == []  # lease still held by the stopped process
+        finished = await wait_finished(manager, stopped["id"])
+        assert finished["status"] == "succeeded"
+        assert executions == ["B"]
+
+    asyncio.run(main())
+
+
+def test_a_job_queued_twice_is_claimed_once(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        executions = []
+        manager = JobManager(recording_run_job(executions, "A"), store=store, workers=3, interactive_workers=0)
+        job = await manager.submit({"query": "q"}, "default")
+        async with manager._wakeup:
+            manager._queues["default"].extend([job["id"], job["id"]])
+            manager._wakeup.notify_all()
+        await wait_finished(manager, job["id"])
+        await asyncio.sleep(0.05)
+        assert executions == ["A"]
+
+    asyncio.run(main())
+
+
+def test_cancel_reaches_a_job_running_in_another_manager(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        executions = []
+        a = JobManager(recording_run_job(executions, "A", seconds=5), store=store, workers=2, interactive_workers=0,
+                       lease=0.15)
+        b = JobManager(recording_run_job(executions, "B"), store=store, workers=2, interactive_workers=0, lease=0.15)
+        job = await a.submit({"query": "q"}, "default")
+        await asyncio.sleep(0.02)
+        assert b.cancel(job["id"])
+        await asyncio.sleep(0.1)
+        assert job["id"] not in a._running
+        assert store.get(job["id"])["status"] == "cancelled"
+        assert not b.cancel(job["id"])
+
+    asyncio.run(main())
+
+
+def test_interactive_jobs_do_not_wait_behind_batch_jobs(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        finished = []
+
+        async def run_job(request, emit):
+            await asyncio.sleep(request["seconds"])
+            finished.append(request["name"])
+            return {"response": request["name"]}
+
+        manager = JobManager(run_job, store=store, workers=2, interactive_workers=1)
+        for i in range(3):
+            await manager.submit({"name": f"batch{i}", "seconds": 0.2}, "batch")
+        job = await manager.submit({"name": "interactive", "seconds": 0.01}, "interactive")
+        await wait_finished(manager, job["id"])
+        assert finished == ["interactive"]
+
+    asyncio.run(main())
+
+
+def test_the_result_reaches_every_waiter(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        manager = JobManager(recording_run_job([], "A"), store=store, workers=2, interactive_workers=0)
+        job = await manager.submit({"query": "q"}, "default")
+        waits = await asyncio.gather(*(manager.wait(job["id"], 2.0) for _ in range(3)))
+        assert [w["status"] for w in waits] == ["succeeded"] * 3
+        assert all(w["result"] == {"response": "A"} for w in waits)
+
+    asyncio.run(main())
+
+
+def test_cancelling_a_running_job_stops_it(tmp_path):
+    async def main():
+        store = JobStore(str(tmp_path / "jobs.sqlite3"))
+        manager = JobManager(recording_run_job([], "A", seconds=5), store=store, workers=2, interactive_workers=0)
+        job = await manager.submit({"query": "q"}, "default")
+        await asyncio.sleep(0.02)
+        events = manager.events(job["id"])
+        assert manager.cancel(job["id"])
+        assert [event async for event in events] == [{"type": "error", "error": "Job cancelled"}]
+        await asyncio.sleep(0.01)
+        assert manager.get(job["id"])["status"] == "cancelled"
+        assert manager.stats()["running"] == 0
+        assert not manager.cancel(job["id"])
+
+    asyncio.run(main())
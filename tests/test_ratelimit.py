@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import pytest
+
+from ratelimit import CircuitOpen, ProviderUnavailable, RateLimits
+
+
+class Outage(Exception):
+    status_code = 503
+
+
+def tripped_limits(reset=0.05):
+    """RateLimits whose Fake/m breaker is open after one outage, with the reset already elapsed"""
+    limits = RateLimits(enabled=True, limits={}, max_retries=0, base_delay=0.0)
+    limiter = limits.get("Fake", "m")
+    limiter.breaker.failures_to_open = 1
+    limiter.breaker.reset = reset
+
+    async def down():
+        raise Outage("down")
+
+    async def trip():
+        with pytest.raises(ProviderUnavailable):
+            await limits.run("Fake", "m", down, 10)
+        with pytest.raises(CircuitOpen):
+            await limits.run("Fake", "m", down, 10)
+        await asyncio.sleep(reset * 2)
+
+    return limits, limiter, trip
+
+
+async def ok():
+    return {"messages": []}
+
+
+async def cancel_trial(limits, started):
+    async def hang():
+        started.set()
+        await asyncio.sleep(10)
+
+    task = asyncio.create_task(limits.run("Fake", "m", hang, 10))
+    await started.wait()
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+def test_cancelled_trial_call_does_not_wedge_the_breaker():
+    async def main():
+        limits, limiter, trip = tripped_limits()
+        await trip()
+        await cancel_trial(limits, asyncio.Event())
+        assert not limiter.breaker.trial_running
+        assert await limits.run("Fake", "m", ok, 10) == {"messages": []}
+        assert limiter.breaker.opened_at is None
+
+    asyncio.run(main())
+
+
+def test_trial_cancelled_while_waiting_for_its_reservation():
+    async def main():
+        limits, limiter, trip = tripped_limits()
+        await trip()
+        limiter.throttle(0.1)
+        task = asyncio.create_task(limits.run("Fake", "m", ok, 10))
+        await asyncio.sleep(0.02)
+        assert limiter.breaker.trial_running
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert not limiter.breaker.trial_running
+        time.sleep(0.1)
+        assert await limits.run("Fake", "m", ok, 10) == {"messages": []}
+
+    asyncio.run(main())
+
+
+def test_no_quotas_unless_configured():
+    limits = RateLimits(enabled=True)
+    limiter = limits.get("Groq", "llama-3.3-70b-versatile")
+    assert limiter.requests is None and limiter.tokens is None
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+
+import response_cache
+from response_cache import MemoryCacheBackend, ResponseCache, SQLiteCacheBackend, cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(response_cache, "time", clock)
+    return clock
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "sqlite":
+        return lambda max_entries: SQLiteCacheBackend(str(tmp_path / "cache.sqlite3"), max_entries=max_entries)
+    return lambda max_entries: MemoryCacheBackend(max_entries=max_entries)
+
+
+def chat_request(query, allow_search=False, **fields):
+    return SimpleNamespace(**{"model_name": "m", "model_provider": "Groq", "system_prompt": "Be brief",
+                              "messages": [query], "allow_search": allow_search, "use_multi_agent": False,
+                              "agent_mode": None, "debate_research": None, "force_full_pipeline": None, **fields})
+
+
+def test_responses_expire_after_their_ttl_and_search_responses_sooner(clock, backend):
+    cache = ResponseCache(backend(10), ttl=100, search_ttl=10)
+    plain, searched = chat_request("q"), chat_request("q", allow_search=True)
+    cache.set(plain, {"final_response": "plain"})
+    cache.set(searched, {"final_response": "searched"})
+    clock.now += 9
+    assert cache.get(searched) == ({"final_response": "searched"}, 9)
+    clock.now += 2
+    assert cache.get(searched) is None
+    assert cache.get(plain)[0] == {"final_response": "plain"}
+    clock.now += 90
+    assert cache.get(plain) is None
+    assert cache.stats() == {"hits": 2, "misses": 2, "entries": 0}
+
+
+def test_least_recently_used_entries_are_evicted_first(clock, backend):
+    cache = ResponseCache(backend(2), ttl=100, search_ttl=10)
+    a, b, c = chat_request("a"), chat_request("b"), chat_request("c")
+    cache.set(a, {"final_response": "a"})
+    clock.now += 1
+    cache.set(b, {"final_response": "b"})
+    clock.now += 1
+    assert cache.get(a) is not None  # a is now more recent than b
+    clock.now += 1
+    cache.set(c, {"final_response": "c"})
+    assert cache.get(b) is None
+    assert cache.get(a) is not None and cache.get(c) is not None
+
+
+def test_errors_are_not_cached(clock, backend):
+    cache = ResponseCache(backend(10))
+    cache.set(chat_request("q"), {"error": "Model not allowed"})
+    assert cache.get(chat_request("q")) is None
+
+
+def test_key_ignores_whitespace_and_fields_the_path_does_not_use():
+    assert cache_key(chat_request("What  is\nAI?")) == cache_key(chat_request("What is AI?"))
+    assert cache_key(chat_request("q", agent_mode="debate")) == cache_key(chat_request("q"))
+    assert cache_key(chat_request("q", use_multi_agent=True, system_prompt="x")) == \
+        cache_key(chat_request("q", use_multi_agent=True, system_prompt="y"))
+    assert cache_key(chat_request("q", allow_search=True)) != cache_key(chat_request("q"))
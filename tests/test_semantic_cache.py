@@ -0,0 +1,41 @@
+import pytest
+
+from semantic_cache import HashedNgramEmbedder, SemanticCache, SEMANTIC_CACHE_THRESHOLD
+
+REVERSED = [
+    ("Should I migrate from AWS to Azure?", "Should I migrate from Azure to AWS?"),
+    ("Is Python faster than Java?", "Is Java faster than Python?"),
+    ("Convert 100 USD to EUR", "Convert 100 EUR to USD"),
+]
+
+NEAR_DUPLICATES = [
+    ("Should I learn Python or JavaScript?", "python vs javascript, which to learn?"),
+    ("What is the capital of France?", "capital of france"),
+]
+
+
+def similarity(a, b):
+    embedder = HashedNgramEmbedder()
+    return float(embedder.embed(a) @ embedder.embed(b))
+
+
+@pytest.mark.parametrize("query, reversed_query", REVERSED)
+def test_reversed_questions_are_not_near_duplicates(query, reversed_query):
+    assert similarity(query, reversed_query) < SEMANTIC_CACHE_THRESHOLD
+    cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD)
+    cache.store(query, "Groq", "m", "sequential", True, {"final_response": "answer"})
+    assert cache.lookup(reversed_query, "Groq", "m", "sequential", True) is None
+    assert cache.lookup(query, "Groq", "m", "sequential", True) is not None
+
+
+@pytest.mark.parametrize("query, rewording", NEAR_DUPLICATES)
+def test_rewordings_are_served_from_the_cache(query, rewording):
+    cache = SemanticCache(threshold=SEMANTIC_CACHE_THRESHOLD)
+    cache.store(query, "Groq", "m", "sequential", True, {"final_response": "answer"})
+    match = cache.lookup(rewording, "Groq", "m", "sequential", True)
+    assert match is not None and match[2] == query
+
+
+def test_rewordings_stay_near_duplicates():
+    assert similarity("How do I bake sourdough bread at home?", "How can I bake sourdough bread at home?") > 0.99
+    assert similarity("Python or JavaScript?", "JavaScript or Python?") > 0.99